@@ -0,0 +1,308 @@
+import numpy as np
+from scipy import sparse
+
+
+LOGIC_TYPES = ('and', 'or', '')
+
+
+class ArrayModel:
+    """
+        Array-backed evaluation of a grn right-hand side.
+
+        Regulators of all genes are packed into flat arrays (one entry per
+        regulator, ordered by gene) and every Hill term and gene rate is
+        computed with a few NumPy operations. States can carry leading batch
+        dimensions, i.e. state has shape (..., n_species).
+
+        Parameter values are taken from the network unless a params dictionary
+        is given ('alpha' - (..., n_genes), 'Kd' and 'n' - (..., n_regulators),
+        'delta' - (..., n_species), see get_params); its leading dimensions
+        broadcast with those of the state, so one model evaluates a batch of
+        parameter sets without regenerating anything.
+    """
+
+    def __init__(self, grn):
+        self.species_names = [species['name'] for species in grn.species]
+        index = {name: i for i, name in enumerate(self.species_names)}
+
+        self.n_species = len(self.species_names)
+        self.n_genes = len(grn.genes)
+
+        self.delta = np.array([species['delta'] for species in grn.species], dtype=float)
+        self.alpha = np.array([gene['alpha'] for gene in grn.genes], dtype=float)
+
+        reg_gene, reg_species, Kd, n, reg_type = [], [], [], [], []
+        up_type = []    # 0 - not in up, 1 - factor x, 2 - factor (1+x)
+        or_genes = []   # genes whose up term is prod(1+x)-1
+        prod_gene, prod_species = [], []
+
+        for g, gene in enumerate(grn.genes):
+            logic_type = gene['logic_type']
+            if logic_type not in LOGIC_TYPES:
+                raise ValueError(f'Invalid logic type {logic_type!r}!')
+
+            first = True
+            for regulator in gene['regulators']:
+                if regulator['name'] not in index:
+                    raise ValueError(f'{regulator["name"]} not in species!')
+
+                reg_gene.append(g)
+                reg_species.append(index[regulator['name']])
+                Kd.append(regulator['Kd'])
+                n.append(regulator['n'])
+                reg_type.append(regulator['type'])
+
+                if regulator['type'] != 1:
+                    up_type.append(0)
+                elif logic_type == 'and':
+                    up_type.append(1)
+                elif logic_type == 'or':
+                    up_type.append(2)
+                    if first:
+                        or_genes.append(g)
+                else:
+                    up_type.append(1 if first else 0)
+
+                if regulator['type'] == 1:
+                    first = False
+
+            for product in gene['products']:
+                if product['name'] not in index:
+                    raise ValueError(f'{product["name"]} not in species!')
+                prod_gene.append(g)
+                prod_species.append(index[product['name']])
+
+        self.reg_gene = np.array(reg_gene, dtype=int)
+        self.reg_species = np.array(reg_species, dtype=int)
+        self.Kd = np.array(Kd, dtype=float)
+        self.n = np.array(n, dtype=float)
+        self.reg_type = np.array(reg_type, dtype=int)
+        self.reg_names = [self.species_names[i] for i in reg_species]
+        self.up_type = np.array(up_type, dtype=int)
+
+        self.or_offset = np.zeros(self.n_genes)
+        self.or_offset[or_genes] = 1
+
+        n_regs = np.bincount(self.reg_gene, minlength=self.n_genes)
+        self.gene_start = np.concatenate([[0], np.cumsum(n_regs)[:-1]]).astype(int)
+        self.has_regs = n_regs > 0
+
+        self.prod_gene = np.array(prod_gene, dtype=int)
+        self.prod_species = np.array(prod_species, dtype=int)
+
+        # species x genes matrix mapping gene rates to production terms
+        self.P = sparse.csr_matrix((np.ones(len(prod_gene)), (self.prod_species, self.prod_gene)),
+                                   shape=(self.n_species, self.n_genes))
+
+        self._init_jacobian_pattern()
+
+    def _init_jacobian_pattern(self):
+        # every (product, regulator) pair of a gene contributes to one Jacobian entry
+        regs_of_gene = [[] for _ in range(self.n_genes)]
+        for r, g in enumerate(self.reg_gene):
+            regs_of_gene[g].append(r)
+
+        pair_row, pair_reg = [], []
+        for g, s in zip(self.prod_gene, self.prod_species):
+            pair_row.extend([s] * len(regs_of_gene[g]))
+            pair_reg.extend(regs_of_gene[g])
+
+        self.pair_reg = np.array(pair_reg, dtype=int)
+        diag = np.arange(self.n_species)
+        rows = np.concatenate([np.array(pair_row, dtype=int), diag])
+        cols = np.concatenate([self.reg_species[self.pair_reg], diag])
+
+        # entries of the same (row, col) are summed into one position of the CSR data
+        flat, self.jac_position = np.unique(rows * self.n_species + cols, return_inverse=True)
+        self.jac_rows = flat // self.n_species
+        self.jac_cols = flat % self.n_species
+        self.jac_indptr = np.searchsorted(self.jac_rows, np.arange(self.n_species + 1))
+
+    def _segment_prod(self, values):
+        # product of per-regulator values over the regulators of each gene (1 for genes without regulators)
+        out = np.ones(values.shape[:-1] + (self.n_genes,))
+        if values.shape[-1]:
+            out[..., self.has_regs] = np.multiply.reduceat(values, self.gene_start[self.has_regs], axis=-1)
+        return out
+
+    def _segment_sum(self, values):
+        out = np.zeros(values.shape[:-1] + (self.n_genes,))
+        if values.shape[-1]:
+            out[..., self.has_regs] = np.add.reduceat(values, self.gene_start[self.has_regs], axis=-1)
+        return out
+
+    def _produce(self, rates):
+        # sum the gene rates into their products
+        if rates.ndim == 1:
+            return self.P @ rates
+        flat = rates.reshape(-1, self.n_genes)
+        return (self.P @ flat.T).T.reshape(rates.shape[:-1] + (self.n_species,))
+
+    def get_params(self, params=None):
+        """Parameter arrays of the network, overridden by the entries of params."""
+        values = {'alpha': self.alpha, 'Kd': self.Kd, 'n': self.n, 'delta': self.delta}
+        if params:
+            for key, value in params.items():
+                if key not in values:
+                    raise ValueError(f'Invalid parameter {key!r}!')
+                values[key] = np.asarray(value, dtype=float)
+        return values
+
+    def param_labels(self):
+        """
+            Labels of all parameters mapped to (array, index) in get_params:
+            alpha[g] and Kd[g:regulator], n[g:regulator] of gene g, delta[species].
+        """
+        labels = {}
+        for g in range(self.n_genes):
+            labels[f'alpha[{g}]'] = ('alpha', g)
+        for kind in ('Kd', 'n'):
+            for r, (g, name) in enumerate(zip(self.reg_gene, self.reg_names)):
+                label = f'{kind}[{g}:{name}]'
+                if label in labels:   # the same regulator listed twice for a gene
+                    label = f'{kind}[{g}:{name}#{r}]'
+                labels[label] = (kind, r)
+        for i, name in enumerate(self.species_names):
+            labels[f'delta[{name}]'] = ('delta', i)
+        return labels
+
+    def batch_size(self, params):
+        # number of parameter sets in params (1 if none of the arrays is batched)
+        sizes = [len(value) for value in self.get_params(params).values() if np.ndim(value) > 1]
+        return max(sizes, default=1)
+
+    def hill(self, state, params=None):
+        p = self.get_params(params)
+        return (state[..., self.reg_species] / p['Kd']) ** p['n']
+
+    def _up_factor(self, x):
+        up_factor = np.where(self.up_type == 1, x, 1.0)
+        return np.where(self.up_type == 2, 1 + x, up_factor)
+
+    def rates(self, state, params=None):
+        p = self.get_params(params)
+        x = self.hill(state, p)
+
+        up = self._segment_prod(self._up_factor(x)) - self.or_offset
+        down = self._segment_prod(1 + x)
+
+        return p['alpha'] * up / down
+
+    def rate_derivatives(self, state, params=None):
+        """Derivatives of every gene rate w.r.t. the concentration of each of its regulators (one value per regulator)."""
+        p = self.get_params(params)
+        Kd, n = p['Kd'], p['n']
+        S = state[..., self.reg_species]
+        dx = n / Kd * (S / Kd) ** (n - 1)
+        return self._rate_hill_derivatives(state, p) * dx
+
+    def _rate_hill_derivatives(self, state, p):
+        # derivatives of every gene rate w.r.t. the Hill term x of each of its regulators
+        x = self.hill(state, p)
+
+        up_factor = self._up_factor(x)
+        up = self._segment_prod(up_factor) - self.or_offset
+        down = self._segment_prod(1 + x)
+
+        # product of the remaining up factors of the gene (leave-one-out, safe for zero factors)
+        is_zero = up_factor == 0
+        zeros = self._segment_sum(is_zero.astype(float))[..., self.reg_gene]
+        nonzero_prod = self._segment_prod(np.where(is_zero, 1.0, up_factor))[..., self.reg_gene]
+        others = np.divide(nonzero_prod, up_factor, out=np.zeros_like(nonzero_prod), where=~is_zero)
+        others = np.where(zeros == 0, others, np.where((zeros == 1) & is_zero, nonzero_prod, 0.0))
+
+        dup = np.where(self.up_type == 0, 0.0, others)
+        up = up[..., self.reg_gene]
+        down = down[..., self.reg_gene]
+
+        return p['alpha'][..., self.reg_gene] * (dup - up / (1 + x)) / down
+
+    def param_jacobian(self, state, params=None):
+        """
+            Derivatives of the right-hand side w.r.t. all parameters, shape (..., n_species, n_params),
+            columns ordered as param_labels (alpha of the genes, Kd and n of the regulators, delta of the species).
+        """
+        state = np.asarray(state, dtype=float)
+        p = self.get_params(params)
+        Kd, n = p['Kd'], p['n']
+        S = state[..., self.reg_species]
+        x = self.hill(state, p)
+        log_ratio = np.where(S > 0, np.log(np.where(S > 0, S, 1) / Kd), 0.0)   # x * log_ratio -> 0 as S -> 0
+
+        d_rate = self._rate_hill_derivatives(state, p)
+        up = self._segment_prod(self._up_factor(x)) - self.or_offset
+        down = self._segment_prod(1 + x)
+
+        # rate derivatives: alpha (one per gene), Kd and n (one per regulator)
+        d_alpha = np.broadcast_to(up / down, state.shape[:-1] + (self.n_genes,))
+        d_Kd = d_rate * (-n / Kd * x)
+        d_n = d_rate * x * log_ratio
+
+        # rates enter the species through P, delta only its own species
+        P = self.P.toarray()
+        columns = [P * d_alpha[..., None, :],
+                   P[:, self.reg_gene] * d_Kd[..., None, :],
+                   P[:, self.reg_gene] * d_n[..., None, :],
+                   -np.eye(self.n_species) * state[..., None, :]]
+        return np.concatenate(columns, axis=-1)
+
+    def _jacobian_data(self, state, params=None):
+        # CSR data of the Jacobian(s), shape (..., nnz)
+        p = self.get_params(params)
+        d = self.rate_derivatives(state, p)
+        state = np.broadcast_to(state, d.shape[:-1] + state.shape[-1:])
+        delta = np.broadcast_to(-p['delta'], state.shape)
+        values = np.concatenate([d[..., self.pair_reg], delta], axis=-1).reshape(-1, len(self.jac_position))
+
+        nnz = len(self.jac_rows)
+        position = (self.jac_position + nnz * np.arange(len(values))[:, None]).ravel()
+        data = np.bincount(position, weights=values.ravel(), minlength=nnz * len(values))
+        return data.reshape(state.shape[:-1] + (nnz,))
+
+    def jacobian(self, state, sparse_output=False, params=None):
+        state = np.asarray(state, dtype=float)
+        data = self._jacobian_data(state, params)
+        if sparse_output:
+            return sparse.csr_matrix((data, self.jac_cols, self.jac_indptr), shape=(self.n_species, self.n_species))
+        J = np.zeros((self.n_species, self.n_species))
+        J[self.jac_rows, self.jac_cols] = data
+        return J
+
+    def block_jacobian(self, states, params=None):
+        """Block-diagonal sparse Jacobian of B independent copies, states of shape (B, n_species)."""
+        states = np.asarray(states, dtype=float)
+        B, N = states.shape
+        nnz = len(self.jac_rows)
+
+        data = self._jacobian_data(states, params).ravel()
+        indices = (self.jac_cols + N * np.arange(B)[:, None]).ravel()
+        indptr = np.concatenate([(self.jac_indptr[:-1] + nnz * np.arange(B)[:, None]).ravel(), [B * nnz]])
+        return sparse.csr_matrix((data, indices, indptr), shape=(B * N, B * N))
+
+    def sparsity(self):
+        """Structural nonzero pattern of the Jacobian (regulator -> product edges and the diagonal)."""
+        return sparse.csr_matrix((np.ones(len(self.jac_rows)), self.jac_cols, self.jac_indptr),
+                                 shape=(self.n_species, self.n_species))
+
+    def jac(self, T, state):
+        return self.jacobian(state)
+
+    def jac_sparse(self, T, state):
+        return self.jacobian(state, sparse_output=True)
+
+    def derivatives(self, state, params=None):
+        state = np.asarray(state, dtype=float)
+        p = self.get_params(params)
+        return self._produce(self.rates(state, p)) - p['delta'] * state
+
+    def solve_model(self, T, state):
+        state = np.asarray(state, dtype=float)
+        if state.ndim == 2:
+            # solve_ivp(vectorized=True) passes states as columns
+            return self.derivatives(state.T).T
+        return self.derivatives(state)
+
+    def solve_model_steady(self, state):
+        return self.solve_model(0, state)
+
+    __call__ = solve_model
@@ -0,0 +1,167 @@
+"""
+    Benchmarks of the main workloads across network sizes, regulators per gene,
+    logic types and batch sizes. Runtime (best of repeats) and peak memory
+    (tracemalloc, measured in a separate run) are written as JSON and can be
+    compared against a stored baseline (both runtime and peak memory):
+
+        python benchmark.py --output bench.json
+        python benchmark.py --baseline bench.json --threshold 1.25
+
+    Benchmark networks contain activators only (monotone systems), which
+    always settle to a steady state, so the steady-state stages terminate.
+    Hill coefficients are integer (n=2) so that small negative overshoots of
+    the solvers near zero concentrations stay finite.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import itertools
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+import params
+import simulator
+from generator import random_network
+
+
+def network_for(size, in_degree, logic, seed=0):
+    return random_network(size, n_inputs=2, in_degree=in_degree, activator_ratio=1.0,
+                          logic_types={logic: 1}, ranges=dict(params.ranges, n=2), seed=seed)
+
+
+def import_model(network, directory, name):
+    network.generate_model(os.path.join(directory, f'{name}.py'))
+    model, jac = simulator.load_model(network, name)
+    return model
+
+
+def get_stages(network, batch, directory):
+    IN = [1, 1]
+    n_RS = len(network.species_names) - 2
+    R0 = np.full(n_RS, 0.5)
+    name = f'bench_model_{os.getpid()}'
+
+    return {
+        'generate_equations': lambda: network.generate_equations(),
+        'generate_model_import': lambda: import_model(network, directory, name),
+        'compile_model': lambda: (network.invalidate_model(), network.compile_model()),
+        'simulate_single': lambda: simulator.simulate_single(network, IN, R0=R0, plot_on=False),
+        'get_steady_single': lambda: simulator.get_steady_single(network, IN, R0=R0, plot_on=False),
+        'get_steady': lambda: simulator.get_steady(network, seed=0),
+        'simulate_sequence': lambda: simulator.simulate_sequence(network, [(1, 0), (0, 1), (1, 1)], plot_on=False),
+        'simulate_ensemble': lambda: simulator.simulate_ensemble(network, IN, np.tile(R0, (batch, 1))),
+    }
+
+
+def measure(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(times), peak
+
+
+def run(sizes=(10, 100), in_degrees=(2, 4), logic_types=('and', 'or'), batches=(1, 16), stages=None, repeat=3):
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        sys.path.insert(0, directory)
+        try:
+            for size, in_degree, logic, batch in itertools.product(sizes, in_degrees, logic_types, batches):
+                network = network_for(size, in_degree, logic)
+                network.compile_model()
+
+                for stage, fn in get_stages(network, batch, directory).items():
+                    if stages and stage not in stages:
+                        continue
+                    # only the ensemble depends on the batch size
+                    if batch != batches[0] and stage != 'simulate_ensemble':
+                        continue
+
+                    runtime, peak = measure(fn, repeat)
+                    results.append({'stage': stage, 'size': size, 'in_degree': in_degree, 'logic': logic,
+                                    'batch': batch if stage == 'simulate_ensemble' else 1,
+                                    'time': runtime, 'peak_memory': peak})
+                    print(f'{stage:22s} size={size:<6d} in_degree={in_degree} logic={logic:3s} '
+                          f'batch={results[-1]["batch"]:<4d} {runtime:10.4f} s {peak / 2**20:10.2f} MiB')
+        finally:
+            sys.path.remove(directory)
+
+    return results
+
+
+def _key(result):
+    return (result['stage'], result['size'], result['in_degree'], result['logic'], result['batch'])
+
+
+def compare(results, baseline, threshold=1.25, metrics=('time', 'peak_memory')):
+    """Results whose runtime or peak memory exceeds threshold times the baseline value (one entry per metric)."""
+    reference = {_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get(_key(result))
+        if base is None:
+            continue
+        for metric in metrics:
+            if not base.get(metric):
+                continue
+            ratio = result[metric] / base[metric]
+            if ratio > threshold:
+                regressions.append(dict(result, metric=metric, baseline_value=base[metric], ratio=ratio))
+    return regressions
+
+
+def _format(metric, value):
+    return f'{value:.4f} s' if metric == 'time' else f'{value / 2**20:.2f} MiB'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GReNMlin benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--in-degrees', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--logic', nargs='+', default=['and', 'or'])
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 16])
+    parser.add_argument('--stages', nargs='+', default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='write results as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='allowed slowdown and memory growth w.r.t. the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.in_degrees, args.logic, args.batches, args.stages, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__,
+                       'results': results}, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f'REGRESSION {r["stage"]} size={r["size"]} in_degree={r["in_degree"]} logic={r["logic"]} '
+                  f'batch={r["batch"]} {r["metric"]}: {_format(r["metric"], r[r["metric"]])} vs '
+                  f'{_format(r["metric"], r["baseline_value"])} ({r["ratio"]:.2f}x)')
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
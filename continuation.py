@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from steady import SteadyStateSystem, solve_system, is_stable, _norm
+
+
+class ContinuationSystem(SteadyStateSystem):
+    """
+        Steady-state system of a grn with one free parameter: the concentration of
+        an input species or a network parameter (a label of ArrayModel.param_labels).
+    """
+
+    def __init__(self, grn, parameter, X0):
+        model = grn.array_model()
+        params = {kind: np.array(value, dtype=float) for kind, value in model.get_params().items()}
+        super().__init__(grn, np.array(X0, dtype=float), params)
+
+        self.parameter = parameter
+        if parameter in grn.input_species_names:
+            self.input = grn.input_species_names.index(parameter)
+        else:
+            labels = model.param_labels()
+            if parameter not in labels:
+                raise ValueError(f'Invalid parameter {parameter!r}!')
+            self.input = None
+            self.kind, self.index = labels[parameter]
+
+    @property
+    def value(self):
+        if self.input is not None:
+            return self.X0[self.input]
+        return self.params[self.kind][self.index]
+
+    @value.setter
+    def value(self, value):
+        if self.input is not None:
+            self.X0[self.input] = value
+        else:
+            self.params[self.kind][self.index] = value
+
+    def value_derivative(self, R):
+        # df/dparameter
+        if self.input is not None:
+            J = self.model.jacobian(self.full(R), sparse_output=self.sparse, params=self.params)
+            column = J[self.n_INS:, self.input]
+            return column.toarray().ravel() if sparse.issparse(column) else column
+
+        value = self.value
+        h = 1e-6 * max(1.0, abs(value))
+        self.value = value + h
+        F_plus = self.residual(R)
+        self.value = value - h
+        F_minus = self.residual(R)
+        self.value = value
+        return (F_plus - F_minus) / (2 * h)
+
+    def extended_jacobian(self, R, tangent):
+        # Jacobian of [f(R, p); tangent . (R, p)] w.r.t. (R, p)
+        J = self.jacobian(R)
+        f_p = self.value_derivative(R)[:, None]
+        if self.sparse:
+            return sparse.bmat([[J, sparse.csr_matrix(f_p)], [sparse.csr_matrix(tangent[None, :-1]), tangent[-1:, None]]], format='csc')
+        return np.block([[J, f_p], [tangent[None, :]]])
+
+
+def _tangent(system, R, previous):
+    # unit tangent of the branch, oriented along the previous tangent
+    A = system.extended_jacobian(R, previous)
+    b = np.zeros(len(R) + 1)
+    b[-1] = 1
+    tangent = system.solve(A, b)
+    return tangent / np.linalg.norm(tangent)
+
+
+def _correct(system, R, p, tangent, tol, max_iter):
+    # Newton iterations on f(R, p) = 0 within the hyperplane normal to tangent through (R, p)
+    y0 = np.append(R, p)
+    y = y0.copy()
+
+    for it in range(max_iter):
+        system.value = y[-1]
+        F = np.append(system.residual(y[:-1]), tangent @ (y - y0))
+        if not np.all(np.isfinite(F)):
+            return None, it
+        if _norm(F) < tol:
+            return y, it
+
+        try:
+            dy = system.solve(system.extended_jacobian(y[:-1], tangent), -F)
+        except np.linalg.LinAlgError:
+            return None, it
+        y = y + dy
+
+    return None, max_iter
+
+
+def continuation(grn, parameter, bounds, IN=None, INS_factor=1, R0=False, start=None, ds=0.1, ds_min=1e-6, ds_max=1.0,
+                 max_steps=1000, tol=1e-8, max_iter=10, stability=True):
+    """
+        Traces a branch of steady states while one input concentration or network
+        parameter varies (pseudo-arclength continuation with predictor-corrector steps).
+
+        parameter: name of an input species or a parameter label (see ArrayModel.param_labels)
+        bounds: (min, max) of the parameter; the trace stops when the branch leaves them
+        IN, INS_factor: concentrations of the (other) inputs (default: all zero)
+        R0: initial guess of the first steady state (random if False)
+        start: parameter value of the first steady state (bounds[0] by default); the branch
+               is followed towards increasing values
+        ds, ds_min, ds_max: initial, minimal and maximal arclength step
+
+        Returns a DataFrame with the parameter column (unless it is an input species),
+        the state of all species, 'stable' (linear stability, if stability is set) and
+        'point' - 'start', 'end', 'fold' (the branch turns back) or 'stability' (stability
+        changes without a fold), '' for regular points.
+    """
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    X0 = np.zeros(n_INS) if IN is None else np.array(IN, dtype=float) * INS_factor
+    system = ContinuationSystem(grn, parameter, X0)
+
+    low, high = bounds
+    system.value = low if start is None else start
+
+    if type(R0) == bool:
+        R0 = np.random.random(n_RS)
+    R, result = solve_system(system, np.array(R0, dtype=float), tol)
+    if not result['converged']:
+        raise ValueError('Initial steady state not found!')
+
+    tangent = _tangent(system, R, np.append(np.zeros(n_RS), 1.0))
+
+    states = [system.full(R)]
+    values = [system.value]
+    tangents = [tangent]
+
+    for step in range(max_steps):
+        y, iterations = None, 0
+        while y is None and ds >= ds_min:
+            y, iterations = _correct(system, R + ds * tangent[:-1], values[-1] + ds * tangent[-1], tangent, tol, max_iter)
+            if y is None:
+                ds /= 2
+        if y is None:
+            break
+
+        R, value = y[:-1], y[-1]
+        system.value = value
+        if not low <= value <= high:
+            break
+
+        tangent = _tangent(system, R, tangent)
+        states.append(system.full(R))
+        values.append(value)
+        tangents.append(tangent)
+
+        if iterations <= 3:
+            ds = min(ds * 1.5, ds_max)
+
+    columns = list(grn.species_names)
+    df = pd.DataFrame(np.array(states), columns=columns)
+    if system.input is None:
+        df.insert(0, parameter, values)
+
+    points = [''] * len(df)
+    points[0], points[-1] = 'start', 'end'
+
+    # folds: the parameter component of the tangent changes sign
+    t_p = np.array([t[-1] for t in tangents])
+    for i in np.flatnonzero(np.sign(t_p[1:]) != np.sign(t_p[:-1])) + 1:
+        points[i if abs(t_p[i]) < abs(t_p[i-1]) else i - 1] = 'fold'
+
+    if stability:
+        stable = []
+        for state, value in zip(states, values):
+            system.value = value
+            stable.append(is_stable(system.jacobian(state[n_INS:])))
+        df['stable'] = stable
+
+        for i in range(1, len(df)):
+            if stable[i] != stable[i-1] and 'fold' not in points[i-1:i+1] and not points[i]:
+                points[i] = 'stability'
+
+    df['point'] = points
+
+    return df
+
+
+def hysteresis(branch, parameter):
+    """Parameter intervals between consecutive folds of a branch (multiple steady states coexist within them)."""
+    folds = branch.loc[branch['point'] == 'fold', parameter].to_numpy()
+    return [(min(a, b), max(a, b)) for a, b in zip(folds[:-1], folds[1:])]
@@ -0,0 +1,220 @@
+import copy
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import minimize
+
+import params
+import simulator
+from sweep import get_targets
+from sensitivity import simulate_schedule_sensitivity, steady_sensitivity
+
+
+class Dataset:
+    """
+        Observations of one experiment.
+
+        schedule: input program [(IN, duration), ...] as in simulator.simulate_schedule
+                  (time series), or a single input vector IN (steady=True)
+        data: observed concentrations, a DataFrame indexed by the observation times with one
+              column per observed species; for steady-state data a Series (species -> value).
+              Missing observations (NaN) are ignored.
+        weights: weights of the squared residuals (e.g. 1/sigma^2), shaped as data (ones by default)
+        R0: initial state of the non-input species (zeros for time series, random for steady states)
+        seed: seed of the random steady-state initial state; it is drawn the same way in every
+              loss evaluation (and every worker process), so the loss is deterministic
+    """
+
+    def __init__(self, schedule, data, weights=None, INS_factor=1, R0=False, steady=False, seed=None):
+        self.schedule = schedule
+        self.steady = steady
+        self.INS_factor = INS_factor
+        self.R0 = R0
+        self.seed = np.random.SeedSequence(seed).entropy
+
+        if steady:
+            data = pd.Series(data, dtype=float)
+            self.times = None
+            self.species = list(data.index)
+        else:
+            data = pd.DataFrame(data, dtype=float)
+            self.times = data.index.to_numpy(dtype=float)
+            self.species = list(data.columns)
+
+        values = data.to_numpy(dtype=float)
+        self.weights = np.ones(values.shape) if weights is None else np.array(weights, dtype=float).reshape(values.shape)
+        self.weights[np.isnan(values)] = 0
+        self.values = np.nan_to_num(values)
+
+    def initial_state(self, n_RS):
+        if self.steady and type(self.R0) == bool:
+            return np.random.default_rng(self.seed).random(n_RS)
+        return self.R0
+
+
+def to_params(grn, labels, theta):
+    # parameter arrays of the network with the fitted values theta of labels
+    model = grn.array_model()
+    index = model.param_labels()
+    values = {kind: np.array(value, dtype=float) for kind, value in model.get_params().items()}
+    for label, value in zip(labels, theta):
+        kind, i = index[label]
+        values[kind][i] = value
+    return values
+
+
+def set_params(grn, values):
+    """Copy of the network with the given parameter values (a mapping label -> value, see ArrayModel.param_labels)."""
+    network = copy.deepcopy(grn)
+    index = network.array_model().param_labels()
+    regulators = [regulator for gene in network.genes for regulator in gene['regulators']]
+
+    for label, value in dict(values).items():
+        if label not in index:
+            raise ValueError(f'Invalid parameter {label!r}!')
+        kind, i = index[label]
+        if kind == 'alpha':
+            network.genes[i]['alpha'] = float(value)
+        elif kind == 'delta':
+            network.species[i]['delta'] = float(value)
+        else:
+            regulators[i][kind] = float(value)
+
+    network.invalidate_model()
+    return network
+
+
+def get_bounds(grn, labels, ranges=params.ranges):
+    # intervals of ranges (per label or per kind); single values only keep the parameters positive
+    index = grn.array_model().param_labels()
+    bounds = []
+    for label in labels:
+        param_range = ranges[label] if label in ranges else ranges[index[label][0]]
+        bounds.append(tuple(param_range) if np.ndim(param_range) else (0, None))
+    return bounds
+
+
+def dataset_loss(grn, dataset, theta, labels, method=None, rtol=1e-8, atol=1e-10):
+    """
+        Weighted least-squares loss 0.5 sum w (S - data)^2 of one dataset and its gradient w.r.t. theta.
+        rtol, atol: tolerances of the time-series solves; at the defaults of solve_ivp the gradient
+                    is off by several percent, which misleads the line search
+    """
+    p = to_params(grn, labels, theta)
+    species = [grn.species_names.index(name) for name in dataset.species]
+
+    if dataset.steady:
+        try:
+            R0 = dataset.initial_state(len(grn.species_names) - len(grn.input_species_names))
+            state, dS = steady_sensitivity(grn, dataset.schedule, dataset.INS_factor, R0, labels, p)
+        except ValueError:
+            return np.inf, np.zeros(len(labels))
+        residual = dataset.weights * (state[species] - dataset.values)
+        return 0.5 * np.sum(residual * (state[species] - dataset.values)), residual @ dS.to_numpy()[species]
+
+    T, Y, S, _ = simulate_schedule_sensitivity(grn, dataset.schedule, dataset.times, dataset.INS_factor,
+                                               dataset.R0, labels, p, method, rtol, atol)
+    residual = dataset.weights * (Y[:, species] - dataset.values)
+    loss = 0.5 * np.sum(residual * (Y[:, species] - dataset.values))
+    return loss, np.einsum('ts,tsp->p', residual, S[:, species])
+
+
+# network and datasets of a fit held by every worker process
+_worker = {}
+
+def _init_worker(grn, datasets, labels, method, rtol, atol):
+    _worker.update(grn=grn, datasets=datasets, labels=labels, method=method, rtol=rtol, atol=atol)
+
+
+def _dataset_task(task):
+    k, theta = task
+    return dataset_loss(_worker['grn'], _worker['datasets'][k], theta, _worker['labels'], _worker['method'],
+                        _worker['rtol'], _worker['atol'])
+
+
+def objective(theta, grn, datasets, labels, method=None, rtol=1e-8, atol=1e-10, executor=None):
+    """Total loss over all datasets and its gradient (datasets are evaluated in parallel with an executor)."""
+    if executor is None:
+        results = [dataset_loss(grn, dataset, theta, labels, method, rtol, atol) for dataset in datasets]
+    else:
+        results = list(executor.map(_dataset_task, [(k, theta) for k in range(len(datasets))]))
+
+    loss = sum(result[0] for result in results)
+    gradient = np.sum([result[1] for result in results], axis=0)
+    return loss, gradient
+
+
+def fit_start(grn, datasets, theta0, labels, bounds, method=None, max_iter=200, tol=1e-8, rtol=1e-8, atol=1e-10,
+              executor=None):
+    # one bounded quasi-Newton (L-BFGS-B) optimization from theta0
+    return minimize(objective, theta0, args=(grn, datasets, labels, method, rtol, atol, executor), jac=True,
+                    method='L-BFGS-B', bounds=bounds, options={'maxiter': max_iter, 'ftol': tol})
+
+
+def _fit_task(task):
+    theta0, bounds, max_iter, tol = task
+    return fit_start(_worker['grn'], _worker['datasets'], theta0, _worker['labels'], bounds, _worker['method'], max_iter, tol,
+                     _worker['rtol'], _worker['atol'])
+
+
+def start_points(grn, labels, bounds, n_starts=1, seed=None):
+    # the current parameter values (clipped to the bounds) followed by random points within the bounds
+    model = grn.array_model()
+    values, index = model.get_params(), model.param_labels()
+    theta = np.array([values[index[label][0]][index[label][1]] for label in labels])
+    low = np.array([b[0] if b[0] is not None else 0 for b in bounds], dtype=float)
+    high = np.array([b[1] if b[1] is not None else 2 * max(t, 1) for b, t in zip(bounds, theta)], dtype=float)
+
+    starts = [np.clip(theta, low, high)]
+    rng = np.random.default_rng(seed)
+    for _ in range(n_starts - 1):
+        starts.append(low + rng.random(len(labels)) * (high - low))
+    return starts
+
+
+def fit(grn, datasets, targets=None, ranges=params.ranges, n_starts=1, max_iter=200, tol=1e-8, method=None, rtol=1e-8, atol=1e-10,
+        n_jobs=1, seed=None):
+    """
+        Fits parameters of a network to datasets (see Dataset) by minimizing the weighted
+        least-squares loss with L-BFGS-B; gradients come from forward sensitivities, so every
+        loss evaluation is a single augmented solve per dataset.
+
+        targets: parameters to fit (see sweep.get_targets)
+        ranges: bounds per kind or per label, as in params.ranges
+        n_starts: number of optimizations; the first starts from the network values, the others
+                  from random points within the bounds (drawn with seed)
+        tol: tolerance of the optimizer (ftol of L-BFGS-B)
+        rtol, atol: tolerances of the time-series solves (tight, the gradients must match the loss)
+        n_jobs: processes (None or -1: all cores); restarts run in parallel, a single start
+                evaluates the datasets in parallel
+
+        Returns a dictionary with
+            'params' - fitted values (Series indexed by label, see set_params),
+            'loss', 'success', 'message', 'n_evals' - of the best start,
+            'starts' - DataFrame with the result of every start.
+    """
+    labels = get_targets(grn, targets)
+    bounds = get_bounds(grn, labels, ranges)
+    starts = start_points(grn, labels, bounds, n_starts, seed)
+
+    n_jobs = simulator.get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        results = [fit_start(grn, datasets, theta0, labels, bounds, method, max_iter, tol, rtol, atol) for theta0 in starts]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(grn, datasets, labels, method, rtol, atol)) as executor:
+            if len(starts) > 1:
+                results = list(executor.map(_fit_task, [(theta0, bounds, max_iter, tol) for theta0 in starts]))
+            else:
+                results = [fit_start(grn, datasets, starts[0], labels, bounds, method, max_iter, tol, rtol, atol, executor)]
+
+    summary = pd.DataFrame([result.x for result in results], columns=labels)
+    summary['loss'] = [result.fun for result in results]
+    summary['success'] = [result.success for result in results]
+
+    best = results[int(np.argmin(summary['loss']))]
+    return {'params': pd.Series(best.x, index=labels),
+            'loss': best.fun,
+            'success': best.success,
+            'message': best.message,
+            'n_evals': best.nfev,
+            'starts': summary}
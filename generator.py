@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.special import zeta
+
+import params
+from grn import grn
+from helpers import get_param_values
+
+
+def draw_in_degrees(rng, size, in_degree=2, degree_dist='fixed'):
+    """
+        Number of regulators of each gene.
+        degree_dist: 'fixed' - in_degree for every gene,
+                     'poisson' - Poisson distributed with mean in_degree,
+                     'powerlaw' - discrete power law (exponent 2.5) scaled to mean in_degree,
+                                  every gene keeps at least one regulator.
+    """
+    if degree_dist == 'fixed':
+        return np.full(size, int(in_degree))
+    if degree_dist == 'poisson':
+        return rng.poisson(in_degree, size)
+    if degree_dist == 'powerlaw':
+        k = rng.zipf(2.5, size)
+        mean = zeta(1.5) / zeta(2.5)   # mean of zipf(2.5), about 1.95
+        # randomized rounding keeps the mean at in_degree
+        return np.maximum(np.floor(k * in_degree / mean + rng.random(size)), 1).astype(int)
+    raise ValueError(f'Invalid degree distribution {degree_dist!r}!')
+
+
+def random_network(n_species, n_inputs=1, in_degree=2, degree_dist='fixed', activator_ratio=0.5,
+                   logic_types={'and': 0.5, 'or': 0.5}, hub_exponent=0, ranges=params.ranges,
+                   dist='uniform', seed=None):
+    """
+        Random network for stress tests and benchmarks.
+
+        Every (non-input) species S1..Sn is the product of one gene whose regulators
+        are drawn without replacement from all species (inputs X1..Xm included).
+
+        in_degree, degree_dist: number of regulators per gene (see draw_in_degrees)
+        activator_ratio: probability that a regulator is an activator
+        logic_types: probabilities of the logic types ('and', 'or', '') of the genes
+        hub_exponent: regulators are chosen with probability proportional to rank^-hub_exponent,
+                      values above 0 produce hub transcription factors
+        ranges, dist: parameter ranges as in params.ranges, see helpers.get_param_values
+    """
+    rng = np.random.default_rng(seed)
+
+    network = grn()
+    for i in range(n_inputs):
+        network.add_input_species(f'X{i+1}')
+
+    deltas = get_param_values(ranges['delta'], rng.random(n_species), dist)
+    for i in range(n_species):
+        network.add_species(f'S{i+1}', float(deltas[i]))
+
+    names = network.species_names
+    n_total = len(names)
+
+    weights = np.ones(n_total)
+    if hub_exponent:
+        weights = np.arange(1, n_total + 1, dtype=float) ** -hub_exponent
+        weights = weights[rng.permutation(n_total)]
+    cdf = np.cumsum(weights) / weights.sum()
+
+    def draw(size):
+        return np.minimum(np.searchsorted(cdf, rng.random(size), side='right'), n_total - 1)
+
+    degrees = np.minimum(draw_in_degrees(rng, n_species, in_degree, degree_dist), n_total)
+    n_regs = degrees.sum()
+
+    alphas = get_param_values(ranges['alpha'], rng.random(n_species), dist)
+    Kds = get_param_values(ranges['Kd'], rng.random(n_regs), dist)
+    ns = get_param_values(ranges['n'], rng.random(n_regs), dist)
+    types = np.where(rng.random(n_regs) < activator_ratio, 1, -1)
+
+    logic_names = list(logic_types)
+    logic_p = np.array([logic_types[name] for name in logic_names], dtype=float)
+    logics = rng.choice(len(logic_names), n_species, p=logic_p / logic_p.sum())
+
+    # all regulators are drawn at once, genes with repeated regulators are redrawn
+    chosen_all = draw(n_regs)
+
+    r = 0
+    for i in range(n_species):
+        k = degrees[i]
+        chosen = list(dict.fromkeys(chosen_all[r:r+k]))
+        while len(chosen) < k:
+            chosen = list(dict.fromkeys(chosen + list(draw(k - len(chosen)))))
+
+        regulators = [{'name': names[j], 'type': int(types[r+m]), 'Kd': float(Kds[r+m]), 'n': float(ns[r+m])}
+                      for m, j in enumerate(chosen)]
+        r += k
+
+        network.add_gene(float(alphas[i]), regulators, [{'name': f'S{i+1}'}], logic_type=logic_names[logics[i]])
+
+    return network
@@ -1,6 +1,9 @@
 
 import numpy as np
+import hashlib
 import simulator
+import modelcache
+from arraymodel import ArrayModel
 from helpers import powerset
 
 import networkx as nx
@@ -14,14 +17,36 @@ class grn:
         self.species_names = []
         self.input_species_names = []
         self.genes = []
+        self.backend = 'codegen'   # evaluation engine used by compile_model
+
+        self._cache = {}
+        self._cache_key = None
+        self._version = 0   # structure version, bumped by invalidate_model
+        self._names = None
+
+    def __getstate__(self):
+        # compiled models are not picklable, they are rebuilt on demand
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        state['_cache_key'] = None
+        return state
 
     def add_input_species(self, name):        
         self.add_species(name, 0) # input species are species that do not degrade
         self.input_species_names.append(name)
 
     def add_species(self, name, delta):
+        names = self._species_set()
         self.species.append({'name': name, 'delta': delta})
         self.species_names.append(name)
+        names.add(name)
+        self.invalidate_model()
+
+    def _species_set(self):
+        # set of species_names for O(1) lookups, rebuilt if the list was replaced or edited in place
+        if self._names is None or self._names[0] is not self.species_names or len(self._names[1]) != len(self.species_names):
+            self._names = (self.species_names, set(self.species_names))
+        return self._names[1]
 
     """
         regulator = {'name': str - name,
@@ -41,19 +66,46 @@ class grn:
                 'products': products,
                 'logic_type': logic_type}
         
+        names = self._species_set()
         for regulator in regulators:
-            if regulator['name'] not in self.species_names:
-                print(f'{regulator["name"]} not in species!')
+            if regulator['name'] not in names:
+                raise ValueError(f'{regulator["name"]} not in species!')
 
         for product in products:
-            if product['name'] not in self.species_names:
-                print(f'{product["name"]} not in species!')
+            if product['name'] not in names:
+                raise ValueError(f'{product["name"]} not in species!')
 
 
         self.genes.append(gene)
-
-
-    def generate_equations(self):
+        self.invalidate_model()
+
+    def invalidate_model(self):
+        # must be called after species or genes are edited in place (e.g. from the GUI)
+        self._cache = {}
+        self._version += 1
+
+    def _structure_key(self):
+        return repr((self.species, self.genes))
+
+    def model_hash(self):
+        """Content hash of the network structure and parameter values."""
+        return hashlib.sha256(self._structure_key().encode()).hexdigest()
+
+    def _cached(self, kind, build):
+        key = self._version
+        if key != self._cache_key:
+            self._cache = {}
+            self._cache_key = key
+        if kind not in self._cache:
+            self._cache[kind] = build()
+        return self._cache[kind]
+
+    def generate_equations(self, expand=False):
+        """
+            expand: if True, the sums over all subsets of regulators are written out
+                    term by term (2^k terms for k regulators) instead of the equivalent
+                    factorized form prod(1+x_i)-1; only useful for verification.
+        """
         equations = {}
         
         for species in self.species:
@@ -83,7 +135,12 @@ class grn:
                 up = ['1']
 
             if logic_type == 'or':
-                up = "+".join(powerset(up, op="*"))
+                if up == ['1']:
+                    up = '1'
+                elif expand:
+                    up = "+".join(powerset(up, op="*"))
+                else:
+                    up = '*'.join([f'(1+{term})' for term in up]) + '-1'
             elif logic_type == 'and':
                 up = '*'.join(up)
             elif logic_type == '':
@@ -92,7 +149,12 @@ class grn:
                 print("Invalid logic type!")
                 return
 
-            down = "+".join(['1'] + powerset(down, op="*"))
+            if expand:
+                down = "+".join(['1'] + powerset(down, op="*"))
+            elif down:
+                down = '*'.join([f'(1+{term})' for term in down])
+            else:
+                down = '1'
 
             terms = f'{gene["alpha"]}*({up})/({down})'
 
@@ -101,27 +163,67 @@ class grn:
 
         return equations
 
-    def generate_model(self, fname='model.py'):
-        equations = self.generate_equations()
-
-        with open(fname, 'w') as f: 
-            print(f'import numpy as np \n', file = f)
-            print(f'def solve_model(T,state):', file = f)
-            
-            all_keys = ', '.join([f'{key}' for key in equations.keys()])
-            all_dkeys = ', '.join([f'd{key}' for key in equations.keys()])
-            
-            print(f'    {all_keys} = state', file=f)
-
-            for key in equations.keys():
-                print(f'    d{key} = {"+".join(equations[key])}', file=f)
-                
-            print(f'    return np.array([{all_dkeys}])', file=f)
-            
-            #print('',file=f)
-            print('',file=f)
-            print(f'def solve_model_steady(state):', file = f)
-            print(f'    return solve_model(0, state)', file = f)
+    def generate_model_source(self, expand=False):
+        equations = self.generate_equations(expand=expand)
+
+        all_keys = ', '.join([f'{key}' for key in equations.keys()])
+        all_dkeys = ', '.join([f'd{key}' for key in equations.keys()])
+
+        lines = ['import numpy as np ', '']
+        lines.append('def solve_model(T,state):')
+        lines.append(f'    {all_keys} = state')
+        for key in equations.keys():
+            lines.append(f'    d{key} = {"+".join(equations[key])}')
+        lines.append(f'    return np.array([{all_dkeys}])')
+        lines.append('')
+        lines.append('def solve_model_steady(state):')
+        lines.append('    return solve_model(0, state)')
+
+        return '\n'.join(lines) + '\n'
+
+    def generate_model(self, fname='model.py', expand=False):
+        with open(fname, 'w') as f:
+            f.write(self.generate_model_source(expand=expand))
+
+    def array_model(self):
+        return self._cached('array', lambda: ArrayModel(self))
+
+    def compile_model(self, backend=None):
+        """
+            Compile solve_model in memory; the result is cached until the network changes
+            (through its methods, or invalidate_model after editing species or genes in place).
+            If a model cache directory is set (modelcache.set_cache_dir), generated code is
+            shared through it between processes and sessions.
+
+            backend: 'codegen' - generated Python expressions (reference)
+                     'numpy' - vectorized evaluation with ArrayModel
+                     None - use self.backend
+        """
+        if backend is None:
+            backend = self.backend
+        if backend == 'numpy':
+            return self.array_model().solve_model
+        if backend != 'codegen':
+            raise ValueError(f'Invalid backend {backend!r}!')
+
+        def build():
+            cache = modelcache.get_cache()
+            if cache is not None:
+                return cache.load(self)
+
+            namespace = {}
+            exec(compile(self.generate_model_source(), '<grn model>', 'exec'), namespace)
+            return namespace['solve_model']
+
+        return self._cached('codegen', build)
+
+    def compile_jacobian(self, sparse=False):
+        """Analytical Jacobian jac(T, state) of solve_model, dense or as a scipy.sparse matrix."""
+        model = self.array_model()
+        return model.jac_sparse if sparse else model.jac
+
+    def jacobian_sparsity(self):
+        return self.array_model().sparsity()
 
 
     def plot_network(self):
@@ -729,9 +729,6 @@ class NetworkDesignerGUI(QMainWindow):
     def run_steady_single(self):
         """Run steady state analysis using get_steady_single"""
         try:
-            self.network.generate_equations()
-            self.network.generate_model()
-            
             input_values = []
             for species in self.network.input_species_names:
                 if species in self.steady_input_values:
@@ -1184,6 +1181,7 @@ class NetworkDesignerGUI(QMainWindow):
                 # Remove from species_names list
                 if name in self.network.species_names:
                     self.network.species_names.remove(name)
+                self.network.invalidate_model()
                 
                 # Update UI
                 self.update_species_list()
@@ -1222,6 +1220,7 @@ class NetworkDesignerGUI(QMainWindow):
             index = self.genes_list.row(current_item)
             if 0 <= index < len(self.network.genes):
                 del self.network.genes[index]
+                self.network.invalidate_model()
                 self.genes_list.takeItem(index)
                 self.update_network_view()
                 self.statusBar().showMessage("Gene deleted", 3000)
@@ -1457,6 +1456,7 @@ class NetworkDesignerGUI(QMainWindow):
                 
                 # Update species names list
                 self.network.species_names = [s['name'] for s in self.network.species]
+                self.network.invalidate_model()
                 
                 # Clear existing values
                 self.input_values = {}
@@ -1,5 +1,6 @@
 import numpy as np
 import itertools
+from scipy.stats import truncnorm
 
 # if param is iterable with two elements, a value from a distribution is used
 def get_param_value(param, dist = 'uniform'):
@@ -21,6 +22,24 @@ def get_param_value(param, dist = 'uniform'):
     return 0
 
 
+# vectorized get_param_value: maps samples u from [0, 1) to parameter values
+def get_param_values(param, u, dist = 'uniform'):
+    u = np.asarray(u, dtype=float)
+
+    if type(param) == float or type(param) == int:
+        return np.full(u.shape, float(param))
+
+    if len(param) == 2 and dist == 'uniform':
+        return param[0] + u * (param[1] - param[0])
+
+    # normal distribution truncated to positive values (same as the rejection loop of get_param_value)
+    if len(param) == 2 and dist == 'normal':
+        mean, sd = param
+        return truncnorm.ppf(u, -mean / sd, np.inf, loc=mean, scale=sd)
+
+    raise ValueError("Invalid option!")
+
+
 def powerset(s, op):    
     T = itertools.chain.from_iterable(itertools.combinations(s, r) for r in range(len(s)+1))
     return [op.join(t) for t in T if t]
@@ -0,0 +1,135 @@
+import time
+import inspect
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+
+class SimulationStats:
+    """
+        Opt-in instrumentation of simulator calls (pass stats=SimulationStats() to a simulator function).
+
+        Collects
+            phases - accumulated wall-clock time per phase ('codegen', 'import', 'integration',
+                     'interpolation', 'plotting', ...),
+            solves - one record per solve_ivp call (or steady-state root finding) with the solver statistics
+                     (nfev, njev, nlu, number of steps, status, message),
+            rhs_calls - total number of right-hand side evaluations,
+            peak_memory - peak traced memory in bytes (only with track_memory=True).
+
+        callback, if given, is called with each solve record as it is added.
+    """
+
+    def __init__(self, track_memory=False, callback=None):
+        self.track_memory = track_memory
+        self.callback = callback
+
+        self.phases = {}
+        self.solves = []
+        self.rhs_calls = 0
+        self.peak_memory = None
+
+        self._depth = 0
+        self._own_trace = False
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def call(self):
+        # wraps a (possibly nested) simulator call; memory is traced over the outermost one
+        if self._depth == 0 and self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_trace = True
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and self._own_trace:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self._own_trace = False
+                self.peak_memory = max(peak, self.peak_memory or 0)
+
+    def add_solution(self, sol, method=None, t_eval=None):
+        # without dense output the steps are the points of sol.t, unless they were replaced by t_eval
+        if sol.sol is not None:
+            n_steps = len(sol.sol.ts) - 1
+        elif t_eval is None:
+            n_steps = len(sol.t) - 1
+        else:
+            n_steps = None
+        self.add_record(method, sol.nfev, sol.njev, sol.nlu, n_steps, sol.status, sol.message)
+
+    def add_record(self, method, nfev, njev, nlu, n_steps, status, message):
+        record = {'method': method,
+                  'nfev': nfev,
+                  'njev': njev,
+                  'nlu': nlu,
+                  'n_steps': n_steps,
+                  'status': status,
+                  'message': message}
+        self.solves.append(record)
+        self.rhs_calls += nfev
+
+        if self.callback is not None:
+            self.callback(record)
+
+    def as_dict(self):
+        solver = {key: sum(record[key] or 0 for record in self.solves) for key in ('nfev', 'njev', 'nlu', 'n_steps')}
+        return {'phases': dict(self.phases),
+                'solver': solver,
+                'n_solves': len(self.solves),
+                'failures': sum(record['status'] < 0 for record in self.solves),
+                'rhs_calls': self.rhs_calls,
+                'peak_memory': self.peak_memory}
+
+
+class NoStats:
+    """Stand-in used when instrumentation is off."""
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    @contextmanager
+    def call(self):
+        yield self
+
+    def add_solution(self, sol, method=None, t_eval=None):
+        pass
+
+    def add_record(self, *args):
+        pass
+
+
+NO_STATS = NoStats()
+
+
+def instrumented(fn):
+    """
+        Gives fn an optional stats keyword (SimulationStats) and passes a no-op stand-in when it is not set.
+        Generator functions are wrapped as generators, so the call spans the whole iteration.
+    """
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, stats=None, **kwargs):
+            if stats is None:
+                stats = NO_STATS
+            with stats.call():
+                yield from fn(*args, stats=stats, **kwargs)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, stats=None, **kwargs):
+        if stats is None:
+            stats = NO_STATS
+        with stats.call():
+            return fn(*args, stats=stats, **kwargs)
+    return wrapper
@@ -0,0 +1,114 @@
+import os
+import sys
+import marshal
+import tempfile
+
+
+# directory of the shared cache; set through the environment so that worker processes inherit it
+CACHE_ENV = 'GRENMLIN_MODEL_CACHE'
+CACHE_MAX_SIZE = 256 * 2**20
+# bump when the generated model source changes, so stale entries are not reused
+MODEL_FORMAT = 1
+
+
+class ModelCache:
+    """
+        Content-addressed on-disk cache of generated models.
+
+        Entries are keyed by grn.model_hash() (structure and parameter values). For
+        every entry the generated module source (<hash>.py) and its compiled bytecode
+        (<hash>.<cache_tag>.bin) are stored. Files are written atomically (temporary
+        file + os.replace), so concurrent writers of the same entry are safe, and the
+        least recently used entries are evicted when the directory exceeds max_size bytes.
+    """
+
+    def __init__(self, directory, max_size=CACHE_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def paths(self, key):
+        key = f'{key}.v{MODEL_FORMAT}'
+        source = os.path.join(self.directory, f'{key}.py')
+        code = os.path.join(self.directory, f'{key}.{sys.implementation.cache_tag}.bin')
+        return source, code
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def get_code(self, grn):
+        """Bytecode of the generated model, generated and stored on a cache miss."""
+        source_path, code_path = self.paths(grn.model_hash())
+
+        try:
+            with open(code_path, 'rb') as f:
+                code = marshal.load(f)
+            os.utime(code_path)   # mark as recently used
+            return code
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+        source = grn.generate_model_source()
+        code = compile(source, source_path, 'exec')
+
+        self._write(source_path, source.encode())
+        self._write(code_path, marshal.dumps(code))
+        self.evict()
+
+        return code
+
+    def load(self, grn):
+        namespace = {}
+        exec(self.get_code(grn), namespace)
+        return namespace['solve_model']
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:   # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def set_cache_dir(directory):
+    """Enables (or with None disables) the model cache for this process and the processes it starts."""
+    if directory is None:
+        os.environ.pop(CACHE_ENV, None)
+    else:
+        os.environ[CACHE_ENV] = os.path.abspath(directory)
+
+
+def get_cache():
+    directory = os.environ.get(CACHE_ENV)
+    if not directory:
+        return None
+    return ModelCache(directory)
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+import simulator
+from instrumentation import instrumented
+from steady import SteadyStateSystem, newton, is_stable
+
+
+def state_bounds(grn):
+    """Upper bounds of the concentrations of the non-input species (all producing genes at full rate)."""
+    model = grn.array_model()
+    n_INS = len(grn.input_species_names)
+    production = model.P @ model.alpha
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upper = production / model.delta
+    upper = np.where(np.isfinite(upper) & (upper > 0), upper, 1.0)
+    return upper[n_INS:]
+
+
+def initial_states(grn, n_samples, seed=None):
+    # random initial states spread over the whole reachable box [0, state_bounds]
+    upper = state_bounds(grn)
+    return np.random.default_rng(seed).random((n_samples, len(upper))) * upper
+
+
+@instrumented
+def converge_batch(grn, X0, R0, params=None, t_chunk=50, t_max=10**4, tol=10**(-4), method=None, stats=None):
+    """
+        Integrates the members of a batch (one state per row of R0, inputs X0) in time chunks
+        of t_chunk as one ODE system; members whose derivatives drop below tol are removed
+        from the system (early stop).
+
+        Returns the final states (inputs first) and the convergence flags of the members.
+    """
+    model = grn.array_model()
+    method = simulator.select_method(method, stacked=True)
+    n_INS = len(X0)
+    B = len(R0)
+    N = n_INS + R0.shape[1]
+
+    states = np.hstack([np.broadcast_to(X0, (B, n_INS)), R0])
+    active = np.flatnonzero(np.max(np.abs(model.derivatives(states, params)), axis=1) >= tol)
+    t = 0
+
+    while len(active) and t < t_max:
+        b = len(active)
+        solve_model, jac = simulator.ensemble_system(model, b, params, method)
+        sol = simulator.integrate(solve_model, [t, t + t_chunk], states[active].ravel(),
+                                  simulator.solver_options(grn, method, jac), stats)
+
+        states[active] = sol.y[:, -1].reshape(b, N)
+        t += t_chunk
+
+        residual = np.max(np.abs(model.derivatives(states[active], params)), axis=1)
+        active = active[residual >= tol]
+
+    converged = np.ones(B, dtype=bool)
+    converged[active] = False
+
+    return states, converged
+
+
+def cluster_states(states, cluster_tol=10**(-2)):
+    """
+        Groups states into clusters (leader clustering): a state joins the first cluster whose
+        center is within cluster_tol (max norm, relative to the magnitude of the center).
+
+        Returns the cluster centers and the cluster label of every state.
+    """
+    centers = []
+    labels = np.empty(len(states), dtype=int)
+
+    for i, state in enumerate(states):
+        if centers:
+            C = np.array(centers)
+            distance = np.max(np.abs(C - state), axis=1) / (1 + np.max(np.abs(C), axis=1))
+            k = np.argmin(distance)
+            if distance[k] < cluster_tol:
+                labels[i] = k
+                continue
+        labels[i] = len(centers)
+        centers.append(state)
+
+    return np.array(centers).reshape(-1, states.shape[1]), labels
+
+
+@instrumented
+def find_attractors(grn, IN, INS_factor=1, n_samples=1000, R0=False, batch_size=256, t_chunk=50, t_max=10**4,
+                    tol=10**(-4), cluster_tol=10**(-2), refine=True, method=None, seed=None, stats=None):
+    """
+        Multistability analysis: integrates n_samples random initial states (spread over
+        the reachable state space, see state_bounds) in batches of batch_size members, stops
+        converged members early and clusters the final states into distinct fixed points.
+
+        R0: initial states of shape (n_samples, n_species - n_inputs) instead of random ones
+        tol: members with max |dS/dt| below tol are converged
+        cluster_tol: relative distance below which two fixed points are the same
+        refine: fixed points are polished with Newton iterations before clustering
+
+        Returns a DataFrame of the attractors (species columns, 'count', 'fraction' - basin
+        fraction among all samples, 'stable' - linear stability), sorted by basin size, and
+        the attractor index of every sample (-1 for samples that did not converge until t_max).
+    """
+    n_INS = len(grn.input_species_names)
+    X0 = np.array(IN, dtype=float).reshape(n_INS) * INS_factor
+
+    if type(R0) == bool:
+        R0 = initial_states(grn, n_samples, seed)
+    R0 = np.array(R0, dtype=float).reshape(-1, len(grn.species_names) - n_INS)
+    n_samples = len(R0)
+
+    states = np.empty((n_samples, len(grn.species_names)))
+    converged = np.empty(n_samples, dtype=bool)
+    for i in range(0, n_samples, batch_size):
+        states[i:i+batch_size], converged[i:i+batch_size] = converge_batch(grn, X0, R0[i:i+batch_size], None, t_chunk,
+                                                                            t_max, tol, method, stats=stats)
+
+    system = SteadyStateSystem(grn, X0)
+    centers, labels = cluster_states(states[converged], cluster_tol)
+
+    if refine:
+        # polishing the cluster centers is enough, members are within cluster_tol of them
+        for k, center in enumerate(centers):
+            R, residual, iterations, success = newton(system, center[n_INS:])
+            if success:
+                centers[k] = system.full(R)
+        # distinct centers can polish to the same fixed point
+        centers, merged = cluster_states(centers, cluster_tol)
+        labels = merged[labels]
+
+    all_labels = np.full(n_samples, -1)
+    all_labels[converged] = labels
+    counts = np.bincount(labels, minlength=len(centers))
+
+    attractors = pd.DataFrame(centers, columns=grn.species_names)
+    attractors['count'] = counts
+    attractors['fraction'] = counts / n_samples
+    attractors['stable'] = [is_stable(system.jacobian(center[n_INS:])) for center in centers]
+
+    order = np.argsort(-counts, kind='stable')
+    attractors = attractors.iloc[order].reset_index(drop=True)
+    rank = np.empty(len(order), dtype=int)
+    rank[order] = np.arange(len(order))
+    all_labels[converged] = rank[all_labels[converged]]
+
+    return attractors, all_labels
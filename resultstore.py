@@ -0,0 +1,217 @@
+import os
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+INDEX_FILE = 'index.json'
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return value
+
+
+def network_metadata(grn):
+    """Content hash and parameter values of a network."""
+    return {'network': grn.model_hash(),
+            'params': {kind: value.tolist() for kind, value in grn.array_model().get_params().items()}}
+
+
+class ShardedArray:
+    """
+        Read-only view of the shards of one entry, concatenated along the first axis.
+        Shards are memory-mapped; a slice within one shard is returned without copying.
+    """
+
+    def __init__(self, shards, columns=None):
+        self.shards = shards
+        self.columns = columns
+        self.offsets = np.cumsum([0] + [len(shard) for shard in shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def shape(self):
+        return (len(self),) + (self.shards[0].shape[1:] if self.shards else ())
+
+    def __getitem__(self, key):
+        rows, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+
+        if isinstance(rows, (int, np.integer)):
+            rows = rows + len(self) if rows < 0 else rows
+            if not 0 <= rows < len(self):
+                raise IndexError('Index out of range!')
+            k = np.searchsorted(self.offsets, rows, side='right') - 1
+            return self.shards[k][(rows - self.offsets[k],) + rest]
+
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            if step == 1:
+                k = np.searchsorted(self.offsets, start, side='right') - 1
+                if k < len(self.shards) and stop <= self.offsets[k+1]:
+                    return self.shards[k][(slice(start - self.offsets[k], stop - self.offsets[k]),) + rest]
+            rows = np.arange(start, stop, step)
+
+        # rows spread over several shards are gathered into a new array
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        rows = np.where(rows < 0, rows + len(self), rows)
+        shard = np.searchsorted(self.offsets, rows, side='right') - 1
+        out = np.empty((len(rows),) + self.shape[1:], dtype=self.shards[0].dtype if self.shards else float)
+        for k in np.unique(shard):
+            out[shard == k] = self.shards[k][rows[shard == k] - self.offsets[k]]
+        return out[(slice(None),) + rest]
+
+    def __array__(self, dtype=None, copy=None):
+        array = np.concatenate(self.shards) if self.shards else np.empty(0)
+        return array.astype(dtype) if dtype is not None else array
+
+
+class ResultStore:
+    """
+        Chunked on-disk store of simulation results.
+
+        Every append writes one shard: trajectories and other arrays as .npy files (read back
+        memory-mapped, see load), tables as .npy values with their columns in the index, or as
+        Parquet (table_format='parquet', requires pyarrow). The index (index.json) lists the
+        shards of every entry with their metadata - network hash and parameter values (with
+        grn), inputs, seed and any other keyword; it is replaced atomically after each append.
+    """
+
+    def __init__(self, directory, table_format='npy'):
+        if table_format not in ('npy', 'parquet'):
+            raise ValueError(f'Invalid table format {table_format!r}!')
+        if table_format == 'parquet' and pyarrow is None:
+            raise ValueError('Parquet storage requires pyarrow!')
+
+        self.directory = directory
+        self.table_format = table_format
+        os.makedirs(directory, exist_ok=True)
+
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def _write_index(self):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(tmp, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _shard_path(self, name, k, suffix):
+        directory = os.path.join(self.directory, name)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(name, f'{k:06d}{suffix}')
+
+    def _next_shard(self, name, kind):
+        # number of the next shard of entry name, checked before any file is written
+        if name not in self.index:
+            return 0
+        if self.index[name]['kind'] != kind:
+            raise ValueError(f'Entry {name!r} does not hold {kind}s!')
+        return len(self.index[name]['shards'])
+
+    def _add(self, name, kind, shard):
+        self.index.setdefault(name, {'kind': kind, 'shards': []})['shards'].append(shard)
+        self._write_index()
+
+    def _metadata(self, grn, metadata):
+        if grn is not None:
+            metadata = dict(network_metadata(grn), **metadata)
+        return _jsonable(metadata)
+
+    def append(self, name, array, T=None, columns=None, grn=None, **metadata):
+        """
+            Appends an array (e.g. Y of simulate_ensemble, shape (B, len(T), n_species)) as a new shard of entry name.
+            T: sample times, stored next to the shard; columns: names of the last axis (species names by default with grn).
+        """
+        k = self._next_shard(name, 'array')
+        array = np.ascontiguousarray(array)
+
+        path = self._shard_path(name, k, '.npy')
+        np.save(os.path.join(self.directory, path), array)
+        shard = {'file': path, 'shape': list(array.shape), 'dtype': array.dtype.str,
+                 'columns': list(columns) if columns is not None else (list(grn.species_names) if grn is not None else None),
+                 'metadata': self._metadata(grn, metadata)}
+
+        if T is not None:
+            shard['T'] = self._shard_path(name, k, '.T.npy')
+            np.save(os.path.join(self.directory, shard['T']), np.asarray(T))
+
+        self._add(name, 'array', shard)
+
+    def append_table(self, name, df, grn=None, **metadata):
+        """Appends the rows of a DataFrame (e.g. returned by get_steady or run_sweep) as a new shard of entry name."""
+        k = self._next_shard(name, 'table')
+        shard = {'columns': [str(column) for column in df.columns], 'rows': len(df),
+                 'metadata': self._metadata(grn, metadata)}
+
+        if self.table_format == 'parquet':
+            shard['file'] = self._shard_path(name, k, '.parquet')
+            df.to_parquet(os.path.join(self.directory, shard['file']), index=False)
+        else:
+            shard['file'] = self._shard_path(name, k, '.npy')
+            np.save(os.path.join(self.directory, shard['file']), np.ascontiguousarray(df.to_numpy(dtype=float)))
+
+        self._add(name, 'table', shard)
+
+    def entries(self):
+        return list(self.index)
+
+    def shards(self, name):
+        """Index records (file, columns, metadata, ...) of the shards of entry name."""
+        if name not in self.index:
+            raise ValueError(f'{name} not in store!')
+        return self.index[name]['shards']
+
+    def metadata(self, name):
+        return [shard['metadata'] for shard in self.shards(name)]
+
+    def _open(self, shard, mmap=True):
+        path = os.path.join(self.directory, shard['file'])
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path, memory_map=mmap).to_numpy(dtype=float)
+        return np.load(path, mmap_mode='r' if mmap else None)
+
+    def load(self, name, shard=None, mmap=True):
+        """
+            Memory-mapped data of entry name: one shard (an array) or, by default, all
+            shards as a ShardedArray (concatenated along the first axis, sliced without copying).
+            Parquet shards are read into memory.
+        """
+        shards = self.shards(name)
+        if shard is not None:
+            return self._open(shards[shard], mmap)
+        return ShardedArray([self._open(record, mmap) for record in shards], shards[0]['columns'] if shards else None)
+
+    def times(self, name, shard=0):
+        record = self.shards(name)[shard]
+        return np.load(os.path.join(self.directory, record['T']), mmap_mode='r') if 'T' in record else None
+
+    def table(self, name, shards=None):
+        """Rows of a table entry as a DataFrame (all shards or the given ones)."""
+        records = self.shards(name)
+        selected = range(len(records)) if shards is None else np.atleast_1d(shards)
+        frames = [pd.DataFrame(self._open(records[k]), columns=records[k]['columns']) for k in selected]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
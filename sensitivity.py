@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import simulator
+from instrumentation import instrumented
+from steady import SteadyStateSystem, solve_system
+from sweep import get_targets
+
+
+def target_columns(grn, targets=None):
+    # labels of the selected parameters and their columns in ArrayModel.param_jacobian
+    labels = get_targets(grn, targets)
+    position = {label: j for j, label in enumerate(grn.array_model().param_labels())}
+    return labels, np.array([position[label] for label in labels], dtype=int)
+
+
+def augmented_system(model, columns, params=None, method='BDF'):
+    """
+        Right-hand side and Jacobian of the states augmented with their sensitivities
+        (ds/dt = J s + df/dtheta); y = [S, s[:, 0], s[:, 1], ...] (parameter-major).
+    """
+    N = model.n_species
+    P = len(columns)
+    params = model.get_params(params)
+
+    def solve_model(T, y):
+        state = y[:N]
+        s = y[N:].reshape(P, N)
+        ds = s @ model.jacobian(state, params=params).T + model.param_jacobian(state, params)[:, columns].T
+        return np.concatenate([model.derivatives(state, params), ds.ravel()])
+
+    # block-diagonal approximation (the dependence of J s on the state is left out),
+    # the Newton iterations of the implicit solvers converge with it
+    def jac(T, y):
+        blocks = sparse.kron(sparse.identity(P + 1), model.jacobian(y[:N], sparse_output=True, params=params), format='csr')
+        return blocks if method in simulator.SPARSE_METHODS else blocks.toarray()
+
+    options = {'method': method}
+    if method in simulator.IMPLICIT_METHODS:
+        options['jac'] = jac
+    return solve_model, options
+
+
+@instrumented
+def simulate_sensitivity(grn, IN, INS_factor=1, t_end=100, R0=False, targets=None, params=None, method=None, rtol=1e-3, atol=1e-6, stats=None):
+    """
+        Forward sensitivity analysis: integrates the states together with their derivatives
+        s = dS/dtheta w.r.t. the parameters (ds/dt = J s + df/dtheta, s(0) = 0) in one solve.
+        Both derivative terms are the analytical ones of ArrayModel (jacobian, param_jacobian).
+
+        targets: parameters (see sweep.get_targets; all parameters by default)
+        params: parameter values overriding those of the network (see ArrayModel.get_params)
+        rtol, atol: solver tolerances (those of solve_ivp by default); sensitivities are only as
+                    accurate as the solve, gradients for optimization need tighter ones
+        method: BDF with the sparse block Jacobian by default (dense, (n_species * (n_targets + 1))^2
+                values, with LSODA)
+
+        Returns T, Y of shape (len(T), n_species), the sensitivities of shape
+        (len(T), n_species, n_targets) and the target labels.
+    """
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+    if type(R0) == bool:
+        R0 = np.random.random(n_RS)
+
+    T = np.arange(0, t_end+1)
+    T, Y, S, labels = simulate_schedule_sensitivity(grn, [(IN, t_end)], T, INS_factor, R0, targets, params, method,
+                                                    rtol, atol, stats=stats)
+    return T, Y, S, labels
+
+
+@instrumented
+def simulate_schedule_sensitivity(grn, schedule, times, INS_factor=1, R0=False, targets=None, params=None, method=None,
+                                  rtol=1e-3, atol=1e-6, stats=None):
+    """
+        Sensitivities along a piecewise-constant input program (schedule as in simulator.simulate_schedule),
+        evaluated at the given (absolute) times. The sensitivities are continuous across input switches.
+
+        R0: initial state of the non-input species (zeros if False)
+        rtol, atol: solver tolerances, as in simulate_sensitivity
+
+        Returns times, Y, the sensitivities and the target labels as simulate_sensitivity.
+    """
+    with stats.phase('codegen'):
+        model = grn.array_model()
+    labels, columns = target_columns(grn, targets)
+
+    n_INS = len(grn.input_species_names)
+    N = len(grn.species_names)
+    P = len(labels)
+
+    if type(R0) == bool:
+        R0 = np.zeros(N - n_INS)
+
+    method = simulator.select_method(method, stacked=True)
+    solve_model, options = augmented_system(model, columns, params, method)
+
+    times = np.asarray(times, dtype=float)
+    if np.any((times < 0) | (times > sum(duration for IN, duration in schedule))):
+        raise ValueError('Times outside of the schedule!')
+    y = np.empty((len(times), N * (P + 1)))
+
+    state = np.concatenate([np.zeros(n_INS), np.array(R0, dtype=float), np.zeros(N * P)])
+    offset = 0
+    for i, (IN, duration) in enumerate(schedule):
+        # segments after the last requested time are not integrated
+        if not np.any(times >= offset):
+            break
+        state[:n_INS] = np.array(IN, dtype=float) * INS_factor
+
+        # times on a switch point belong to the later segment
+        last = i == len(schedule) - 1
+        inside = (times >= offset) & ((times < offset + duration) | (last & (times <= offset + duration)))
+
+        # segments without requested times only carry the state over
+        sol = simulator.integrate(solve_model, [0, duration], state, options, stats,
+                                  dense_output=bool(np.any(inside)), rtol=rtol, atol=atol)
+        if np.any(inside):
+            with stats.phase('interpolation'):
+                y[inside] = sol.sol(times[inside] - offset).T
+
+        offset += duration
+        state = sol.y[:, -1].copy()
+
+    return times, y[:, :N], y[:, N:].reshape(len(times), P, N).transpose(0, 2, 1), labels
+
+
+def steady_sensitivity(grn, IN, INS_factor=1, R0=False, targets=None, params=None, relative=False, tol=1e-8):
+    """
+        Sensitivities of a steady state: solves J dS/dtheta = -df/dtheta at the fixed point
+        (found as in steady.find_steady) over the non-input species.
+
+        params: parameter values overriding those of the network (see ArrayModel.get_params)
+        relative: scaled sensitivities theta/S dS/dtheta
+
+        Returns the steady state and a DataFrame of the sensitivities (rows - species, columns - targets).
+    """
+    model = grn.array_model()
+    labels, columns = target_columns(grn, targets)
+    params = model.get_params(params)
+    n_INS = len(grn.input_species_names)
+
+    if type(R0) == bool:
+        R0 = np.random.random(len(grn.species_names) - n_INS)
+
+    system = SteadyStateSystem(grn, np.array(IN, dtype=float) * INS_factor, params)
+    R, result = solve_system(system, np.array(R0, dtype=float), tol)
+    if not result['converged']:
+        raise ValueError('Steady state not found!')
+    state = system.full(R)
+
+    J = system.jacobian(R)
+    F = model.param_jacobian(state, params)[n_INS:][:, columns]
+
+    dS = np.zeros((len(state), len(labels)))
+    dS[n_INS:] = system.solve(J, -F) if not system.sparse else np.column_stack([system.solve(J, -f) for f in F.T])
+
+    if relative:
+        values = np.concatenate([np.ravel(value) for value in params.values()])[columns]
+        scale = np.divide(1, state, out=np.zeros_like(state), where=state != 0)
+        dS = dS * values * scale[:, None]
+
+    return state, pd.DataFrame(dS, index=grn.species_names, columns=labels)
@@ -1,11 +1,20 @@
 import numpy as np
 import importlib
 import matplotlib.pyplot as plt
-from scipy.integrate import solve_ivp
+from scipy.integrate import solve_ivp, LSODA, BDF, Radau, RK23, RK45, DOP853
 import pandas as pd
 import os 
+from concurrent.futures import ProcessPoolExecutor
+from steady import find_steady
+from instrumentation import instrumented, NO_STATS
 
 
+# solvers that can exploit sparse Jacobians; single networks are integrated with LSODA and a dense
+# Jacobian unless one of them is requested (method='BDF' for networks of thousands of species)
+SPARSE_METHODS = ('BDF', 'Radau')
+IMPLICIT_METHODS = ('LSODA',) + SPARSE_METHODS
+SOLVERS = {'LSODA': LSODA, 'BDF': BDF, 'Radau': Radau, 'RK23': RK23, 'RK45': RK45, 'DOP853': DOP853}
+
 
 def generate_bin_vectors(INS_num):
     vects = []
@@ -17,15 +26,123 @@ def generate_bin_vectors(INS_num):
         
     return np.array(vects)
 
-def get_steady(grn, model=False, rep_num=1, INS_def=False, INS_factor=1, eps=10**(-3)):
-    if type(model) == bool:
-        grn.generate_model()
-        model = 'model'
+def generate_gray_vectors(INS_num):
+    # all input vectors in Gray-code order, consecutive vectors differ in a single input
+    vects = []
+
+    for i in range(2**INS_num):
+        g = i ^ (i >> 1)
+        vects.append([(g >> (INS_num - 1 - j)) & 1 for j in range(INS_num)])
+
+    return np.array(vects, dtype=int).reshape(-1, INS_num)
+
+def select_method(method=None, stacked=False):
+    # None: LSODA for a single network, BDF with sparse block Jacobians for stacked systems
+    # (ensembles, sensitivities), whose dense Jacobian grows with the square of the number of copies
+    if method is None:
+        return 'BDF' if stacked else 'LSODA'
+    return method
+
+def load_model(grn, model=False, jac=None, method='LSODA', stats=NO_STATS):
+    # model - False/True: compile the network in memory, str: import a generated module, otherwise a callable
+    # jac - None: analytical Jacobian of a compiled network (finite differences otherwise), False: never, otherwise a callable
+    with stats.phase('codegen'):
+        if jac is False:
+            jac = None
+        elif jac is None and type(model) == bool:
+            jac = grn.compile_jacobian(sparse=method in SPARSE_METHODS)
+
+        if type(model) == bool:
+            model = grn.compile_model()
+
     if type(model) == str:
-        # read the model module    
-        model_module = importlib.import_module(model.replace(os.sep,'.')) 
-        model_module = importlib.reload(model_module) 
-        model = model_module.solve_model
+        with stats.phase('import'):
+            # read the model module    
+            model_module = importlib.import_module(model.replace(os.sep,'.')) 
+            model_module = importlib.reload(model_module) 
+            model = model_module.solve_model
+
+    return model, jac
+
+def solver_options(grn, method, jac):
+    options = {'method': method}
+    if method not in IMPLICIT_METHODS:
+        return options
+    options['jac'] = jac
+    if jac is None and method in SPARSE_METHODS:
+        # finite differences over the structural nonzeros only
+        options['jac_sparsity'] = grn.jacobian_sparsity()
+    return options
+
+def integrate(model, t_span, S0, options, stats=NO_STATS, **kwargs):
+    with stats.phase('integration'):
+        sol = solve_ivp(model, t_span, S0, **kwargs, **options)
+    stats.add_solution(sol, options['method'], kwargs.get('t_eval'))
+    return sol
+
+def repetition_states(n_RS, rep_num, seed=None):
+    # one random initial state per repetition; with a seed every repetition gets its own independent stream
+    if seed is None:
+        return [np.random.random(n_RS) for _ in range(rep_num)]
+    return [np.random.default_rng(s).random(n_RS) for s in np.random.SeedSequence(seed).spawn(rep_num)]
+
+
+def get_n_jobs(n_jobs):
+    if n_jobs is None or n_jobs < 1:
+        return os.cpu_count()
+    return n_jobs
+
+
+# model compiled once per worker process by init_worker
+_worker = {}
+
+def init_worker(grn, model=False, jac=None, method=None):
+    method = select_method(method)
+    _worker['grn'] = grn
+    _worker['method'] = method
+    _worker['model'], _worker['jac'] = load_model(grn, model, jac, method)
+
+
+def steady_state(grn, X0, R0, eps, model, jac, method, solver, stats=None):
+    if solver == 'newton':
+        stats = stats or NO_STATS
+        with stats.phase('root finding'):
+            result = find_steady(grn, X0, R0=R0, tol=eps)
+        stats.add_record(result['method'], result['nfev'], result['njev'], result['nlu'], result['iterations'],
+                         0 if result['converged'] else -1, 'converged' if result['converged'] else 'not converged')
+        if result['converged'] and result['stable'] is not False:
+            return result['state']
+        # no stable fixed point found (e.g. a long transient), integrate instead
+        solver = 'event'
+    if solver == 'event':
+        T, Y, t_steady = get_steady_event(grn, X0, model=model, jac=jac, method=method, tol=eps, R0=R0, max_samples=2, stats=stats)
+        return Y[-1]
+    states = get_steady_single(grn, X0, model=model, jac=jac, method=method, plot_on=False, eps=eps, R0=R0, stats=stats)
+    return states[-1]
+
+
+def _steady_task(task):
+    X0, R0, eps, solver = task
+    return steady_state(_worker['grn'], X0, R0, eps, _worker['model'], _worker['jac'], _worker['method'], solver)
+
+
+@instrumented
+def get_steady(grn, model=False, rep_num=1, INS_def=False, INS_factor=1, eps=10**(-3), jac=None, method=None, n_jobs=1, seed=None, solver='integrate', store=None, store_name='steady', stats=None):
+    """
+        solver: 'integrate' - time integration until the states change less than eps (get_steady_single)
+                'event' - one continuous integration until the derivative norm drops below eps (get_steady_event)
+                'newton' - direct root finding with steady.find_steady (max |dS/dt| < eps), falling back
+                           to 'event' when no stable fixed point is found; the network is solved with
+                           its own array model, so model must not be a custom callable or module
+        n_jobs: number of worker processes for the (repetition, input vector) runs (None or -1: all cores)
+        seed: seed of the random initial states, reproducible regardless of n_jobs
+        stats: instrumentation.SimulationStats collecting timings and solver statistics
+               (with n_jobs > 1 the runs in the workers are timed as a whole, as phase 'workers')
+        store: resultstore.ResultStore the table is appended to (entry store_name), with the
+               network hash and parameters, inputs, seed and solver as metadata
+    """
+    if solver == 'newton' and type(model) != bool:
+        raise ValueError('Custom models cannot be used with solver newton!')
 
     n_INS = len(grn.input_species_names)
     n_RS = len(grn.species_names) - n_INS
@@ -36,34 +153,81 @@ def get_steady(grn, model=False, rep_num=1, INS_def=False, INS_factor=1, eps=10*
     else:
         INS = generate_bin_vectors(n_INS) * INS_factor
 
+    tasks = [(X0, R0, eps, solver) for R0 in repetition_states(n_RS, rep_num, seed) for X0 in INS]
 
-    STATES = []
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        method = select_method(method)
+        model, jac = load_model(grn, model, jac, method, stats)
 
-    for _ in range(rep_num):
-        R0 = np.random.random(n_RS)
+        STATES = [steady_state(grn, X0, R0, eps, model, jac, method, solver, stats) for X0, R0, eps, solver in tasks]
+    else:
+        # workers get the network once and compile their own model (compiled models are not picklable)
+        with stats.phase('workers'), ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker, initargs=(grn, model, jac, method)) as executor:
+            STATES = list(executor.map(_steady_task, tasks, chunksize=max(1, len(tasks) // (4 * n_jobs))))
 
-        for X0 in INS:
-            
-            states = get_steady_single(grn, model, X0, plot_on=False, eps=eps, R0=R0)
-            STATES.append(states[-1])
+
+    df = pd.DataFrame(np.array(STATES).reshape(len(tasks), len(grn.species_names)), columns=grn.species_names)
+
+    if store is not None:
+        store.append_table(store_name, df, grn=grn, inputs=np.asarray(INS, dtype=float), rep_num=rep_num, seed=seed, solver=solver)
+
+    return df
 
 
+@instrumented
+def get_truth_table(grn, model=False, INS_factor=1, R0=False, solver='event', warm_start=True, branches=1, eps=10**(-3), seed=None, jac=None, method=None, stats=None):
+    """
+        Steady states for all 2^n input vectors, visited in Gray-code order so that
+        consecutive inputs differ in one bit. With warm_start every steady-state solve
+        starts from the previous fixed point instead of a fresh initial state.
+
+        branches: number of branches tracked independently (for multistable circuits), each
+                  starting from its own random initial state (drawn with seed) and followed
+                  through all inputs; R0, if given, is the initial state of a single branch
+        solver: 'event' (default), 'integrate' or 'newton' (see get_steady); integration follows
+                the dynamics from the previous state, so every branch ends in the attractor it
+                is driven to, while Newton may jump to another fixed point of a multistable circuit
+
+        Returns a DataFrame laid out like get_steady (one block of 2^n rows per branch,
+        inputs in binary order).
+    """
+    if solver == 'newton' and type(model) != bool:
+        raise ValueError('Custom models cannot be used with solver newton!')
+
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    method = select_method(method)
+    model, jac = load_model(grn, model, jac, method, stats)
+
+    if type(R0) == bool:
+        starts = repetition_states(n_RS, branches, seed)
+    else:
+        starts = [np.array(R0, dtype=float)]
+
+    gray = generate_gray_vectors(n_INS)
+    # position of every Gray-code vector in binary order
+    order = gray @ (2 ** np.arange(n_INS - 1, -1, -1)) if n_INS else np.zeros(1, dtype=int)
+
+    STATES = np.empty((len(starts) * len(gray), n_INS + n_RS))
+    for b, start in enumerate(starts):
+        state = start
+        for X0, row in zip(gray * INS_factor, order):
+            steady = steady_state(grn, X0, state, eps, model, jac, method, solver, stats)
+            STATES[b * len(gray) + row] = steady
+            state = steady[n_INS:] if warm_start else start
+
     df = pd.DataFrame(STATES)
     df.columns = grn.species_names
 
     return df
 
 
-def get_steady_single(grn, IN, model=False, INS_factor=1, plot_on=True, legend=True, eps=10**(-3), R0=False, xlabel='time [a.u.]', ylabel='concentrations [a.u.]'):
-    # read the model module    
-    
-    if type(model) == bool:
-        grn.generate_model()
-        model = 'model'
-    if type(model)==str:
-        model_module = importlib.import_module(model.replace(os.sep,'.')) 
-        model_module = importlib.reload(model_module) 
-        model = model_module.solve_model
+@instrumented
+def get_steady_single(grn, IN, model=False, INS_factor=1, plot_on=True, legend=True, eps=10**(-3), R0=False, xlabel='time [a.u.]', ylabel='concentrations [a.u.]', jac=None, method=None, stats=None):
+    method = select_method(method)
+    model, jac = load_model(grn, model, jac, method, stats)
 
     n_INS = len(grn.input_species_names)
     n_RS = len(grn.species_names) - n_INS
@@ -83,8 +247,9 @@ def get_steady_single(grn, IN, model=False, INS_factor=1, plot_on=True, legend=T
 
     while True:
 
-        sol = solve_ivp(model, [0, t_step], states[-1], dense_output=True, method='LSODA') # gre za stiff problem, uporaba LSODA
-        z = sol.sol(T)
+        sol = integrate(model, [0, t_step], states[-1], solver_options(grn, method, jac), stats, dense_output=True) # gre za stiff problem, uporaba LSODA
+        with stats.phase('interpolation'):
+            z = sol.sol(T)
         Y = z.T
         
         
@@ -95,27 +260,72 @@ def get_steady_single(grn, IN, model=False, INS_factor=1, plot_on=True, legend=T
         states.append(Y[-1])
 
     if plot_on:
-        plt.plot(states)
-        if legend:
-            plt.legend(grn.species_names)
+        with stats.phase('plotting'):
+            plt.plot(states)
+            if legend:
+                plt.legend(grn.species_names)
 
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
+            plt.xlabel(xlabel)
+            plt.ylabel(ylabel)
 
-        plt.show()
+            plt.show()
 
     return states
 
 
-def simulate_single(grn, IN, model=False, INS_factor=1, t_end=100, plot_on=True, legend=True, R0=False, xlabel='time [a.u.]', ylabel='concentrations [a.u.]'):
-    if type(model) == bool:
-        grn.generate_model()
-        model = 'model'
-    if type(model)==str:        
-        # read the model module    
-        model_module = importlib.import_module(model.replace(os.sep,'.')) 
-        model_module = importlib.reload(model_module) 
-        model = model_module.solve_model
+@instrumented
+def get_steady_event(grn, IN, model=False, INS_factor=1, tol=10**(-3), t_max=10**4, t_sample=1, max_samples=1000, R0=False, jac=None, method=None, stats=None):
+    """
+        Integrates once, without restarts, until max|dS/dt| drops below tol (terminal solver event).
+
+        Only the states at multiples of t_sample are recorded; t_sample is increased
+        so that at most max_samples states are kept over [0, t_max]. The state at the
+        event is appended as the last sample.
+
+        Returns T, Y and t_steady, the time to steady state (None if t_max was reached first).
+    """
+    method = select_method(method)
+    model, jac = load_model(grn, model, jac, method, stats)
+
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    X0 = np.array(IN)*INS_factor
+    if type(R0)==bool:
+        R0 = np.random.random(n_RS)
+
+    S0 = np.append(X0,R0)
+
+    # already steady, the event would never fire (it only triggers on a decreasing residual)
+    if np.max(np.abs(model(0, S0))) < tol:
+        return np.zeros(1), S0[None, :], 0.0
+
+    def steady_event(T, state):
+        return np.max(np.abs(model(T, state))) - tol
+    steady_event.terminal = True
+    steady_event.direction = -1
+
+    t_sample = max(t_sample, t_max / max_samples)
+    t_eval = np.arange(0, t_max + t_sample/2, t_sample)
+    t_eval = t_eval[t_eval <= t_max]
+
+    sol = integrate(model, [0, t_max], S0, solver_options(grn, method, jac), stats, t_eval=t_eval, events=steady_event)
+
+    T = sol.t
+    Y = sol.y.T
+    t_steady = None
+    if sol.status == 1:
+        t_steady = sol.t_events[0][0]
+        T = np.append(T, t_steady)
+        Y = np.vstack([Y, sol.y_events[0][0]])
+
+    return T, Y, t_steady
+
+
+@instrumented
+def simulate_single(grn, IN, model=False, INS_factor=1, t_end=100, plot_on=True, legend=True, R0=False, xlabel='time [a.u.]', ylabel='concentrations [a.u.]', jac=None, method=None, stats=None):
+    method = select_method(method)
+    model, jac = load_model(grn, model, jac, method, stats)
 
     n_INS = len(grn.input_species_names)
     n_RS = len(grn.species_names) - n_INS
@@ -126,67 +336,302 @@ def simulate_single(grn, IN, model=False, INS_factor=1, t_end=100, plot_on=True,
         
     S0 = np.append(X0,R0)
 
-    sol = solve_ivp(model, [0, t_end], S0, dense_output=True, method='LSODA') # gre za stiff problem, uporaba LSODA
+    sol = integrate(model, [0, t_end], S0, solver_options(grn, method, jac), stats, dense_output=True) # gre za stiff problem, uporaba LSODA
     T = np.arange(0, t_end+1)
-    z = sol.sol(T)
+    with stats.phase('interpolation'):
+        z = sol.sol(T)
     Y = z.T
 
     if plot_on:
-        plt.plot(T,Y)
-        if legend:
-            plt.legend(grn.species_names)
-        
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        
-        plt.show()
+        with stats.phase('plotting'):
+            plt.plot(T,Y)
+            if legend:
+                plt.legend(grn.species_names)
+            
+            plt.xlabel(xlabel)
+            plt.ylabel(ylabel)
+            
+            plt.show()
 
     return T,Y
 
 
-def simulate_sequence(grn, IN_seq, model=False, INS_factor=1, t_single=100, plot_on=True, legend=True, xlabel='time [a.u.]', ylabel='concentrations [a.u.]'):
-    if type(model) == bool:
-        grn.generate_model()
-        model = 'model'
-    if type(model)==str:        
-        # read the model module    
-        model_module = importlib.import_module(model.replace(os.sep,'.')) 
-        model_module = importlib.reload(model_module) 
-        model = model_module.solve_model
+@instrumented
+def simulate_stream(grn, IN, model=False, INS_factor=1, t_end=100, dt=1, chunk_size=1000, R0=False, jac=None, method=None, stats=None):
+    """
+        Generator version of simulate_single for long simulations: yields (T, Y) chunks of at
+        most chunk_size time points (spaced by dt) as the integration proceeds. Only the current
+        chunk and the interpolant of the current solver step are kept in memory.
+
+        for T, Y in simulator.simulate_stream(my_grn, IN, t_end=10**6):
+            ...
+    """
+    method = select_method(method)
+    model, jac = load_model(grn, model, jac, method, stats)
+
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    X0 = np.array(IN)*INS_factor
+    if type(R0)==bool:
+        R0 = np.random.random(n_RS)
+
+    S0 = np.append(X0,R0)
+    n_points = int(np.floor(t_end / dt + 1e-9)) + 1
+
+    options = solver_options(grn, method, jac)
+    solver = SOLVERS[options.pop('method')](model, 0, S0, t_end, **options)
+
+    T = np.empty(chunk_size)
+    Y = np.empty((chunk_size, len(S0)))
+    T[0], Y[0] = 0, S0
+    filled = 1
+    i = 1   # index of the next time point to output
+
+    n_steps = 0
+    message = None
+
+    while i < n_points:
+        if filled == chunk_size:
+            yield T.copy(), Y.copy()
+            filled = 0
+
+        if solver.status != 'running':
+            break
+
+        with stats.phase('integration'):
+            message = solver.step()
+            n_steps += 1
+        if solver.status == 'failed':
+            break
 
+        with stats.phase('interpolation'):
+            last = min(int(np.floor(solver.t / dt + 1e-9)), n_points - 1) if solver.status == 'running' else n_points - 1
+            if last >= i:
+                sol = solver.dense_output()
+                while i <= last:
+                    k = min(last - i + 1, chunk_size - filled)
+                    t = (i + np.arange(k)) * dt
+                    T[filled:filled+k] = t
+                    Y[filled:filled+k] = sol(t).T
+                    filled += k
+                    i += k
+                    if filled == chunk_size and i <= last:
+                        yield T.copy(), Y.copy()
+                        filled = 0
+
+    stats.add_record(method, solver.nfev, solver.njev, solver.nlu, n_steps,
+                     -1 if solver.status == 'failed' else 0, message if solver.status == 'failed' else 'success')
+
+    if filled:
+        yield T[:filled].copy(), Y[:filled].copy()
+
+
+def broadcast_ensemble(grn, INS, R0=False, INS_factor=1, size=1):
+    # stacks input vectors and initial states of the ensemble members into an array of shape (B, N)
     n_INS = len(grn.input_species_names)
     n_RS = len(grn.species_names) - n_INS
-    R0 = False
 
-    T = False
-    Y = False
+    if n_INS:
+        X0 = np.array(INS, dtype=float).reshape(-1, n_INS) * INS_factor
+    else:
+        X0 = np.zeros((1, 0))   # networks without inputs (e.g. toggle switches)
+    if type(R0) == bool:
+        R0 = np.random.random((max(len(X0), size), n_RS))
+    R0 = np.atleast_2d(np.array(R0, dtype=float).reshape(-1, n_RS))
+
+    B = max(len(X0), len(R0), size)
+    X0 = np.broadcast_to(X0, (B, n_INS))
+    R0 = np.broadcast_to(R0, (B, n_RS))
+
+    return np.hstack([X0, R0])
 
-    for IN in IN_seq:
 
-        X0 = np.array(IN)*INS_factor
-        if type(R0)==bool:
-            #R0 = np.random.random(n_RS)
-            R0 = np.zeros(n_RS)
-        else:
-            R0 = Y1[-1, -n_RS:]
+def ensemble_system(model, B, params, method):
+    # right-hand side and block-diagonal Jacobian of B copies of an ArrayModel integrated as one system
+    N = model.n_species
 
-        T1, Y1 = simulate_single(grn, X0, model, INS_factor=1, t_end=t_single, plot_on=False, R0=R0)
+    def solve_model(T, state):
+        return model.derivatives(state.reshape(B, N), params).ravel()
 
-        if type(T) == bool:
-            T = T1
-            Y = Y1
-        else:
-            Y = np.concatenate([Y, Y1])
-            T = np.append(T, T1+T[-1])
+    if method in SPARSE_METHODS:
+        jac = lambda T, state: model.block_jacobian(state.reshape(B, N), params)
+    else:
+        jac = lambda T, state: model.block_jacobian(state.reshape(B, N), params).toarray()
+
+    return solve_model, jac
+
+
+@instrumented
+def simulate_ensemble(grn, INS, R0=False, INS_factor=1, t_end=100, method=None, params=None, stats=None):
+    """
+        Simulates B copies of the network in a single ODE solve.
+
+        INS: input vectors of shape (B, n_inputs) or a single input vector shared by all copies
+        R0: initial states of shape (B, n_species - n_inputs), a single shared state or False (random)
+        params: parameter arrays of the copies, e.g. {'alpha': (B, n_genes), 'Kd': (B, n_regulators)}
+                (see ArrayModel.get_params); one compiled model evaluates all parameter sets
+        method: BDF with the sparse block-diagonal Jacobian by default; with LSODA the Jacobian
+                is dense, (B * n_species)^2 values
+
+        Returns T and Y of shape (B, len(T), n_species).
+    """
+    with stats.phase('codegen'):
+        model = grn.array_model()
+    params = model.get_params(params)
+    S0 = broadcast_ensemble(grn, INS, R0, INS_factor, model.batch_size(params))
+    B, N = S0.shape
+
+    method = select_method(method, stacked=True)
+    solve_model, jac = ensemble_system(model, B, params, method)
+
+    sol = integrate(solve_model, [0, t_end], S0.ravel(), solver_options(grn, method, jac), stats, dense_output=True)
+    T = np.arange(0, t_end+1)
+    with stats.phase('interpolation'):
+        Y = sol.sol(T).T.reshape(len(T), B, N).transpose(1, 0, 2)
+
+    return T, Y
+
+
+POPULATION_SCHEMES = ('euler', 'heun', 'semi-implicit')
+
+def stable_step(model, states, params, scheme='heun', safety=0.1):
+    # largest fixed step within the stability limit 2/rho of the explicit part, rho is bounded by
+    # the Gershgorin radii of the Jacobians of all cells (degradation is implicit in the semi-implicit scheme)
+    data = model._jacobian_data(states, params)
+    if scheme == 'semi-implicit':
+        # the signed diagonal includes -delta, which is integrated implicitly
+        diagonal = np.flatnonzero(model.jac_rows == model.jac_cols)
+        data[..., diagonal] += params['delta'][..., model.jac_rows[diagonal]]
+    data = np.abs(data)
+    rho = np.max(np.add.reduceat(data, model.jac_indptr[:-1], axis=-1)) if data.size else 0
+    return safety * 2 / rho if rho > 0 else np.inf
+
+def population_step(model, states, params, dt, scheme):
+    if scheme == 'euler':
+        return np.maximum(states + dt * model.derivatives(states, params), 0)
+    if scheme == 'heun':
+        k1 = model.derivatives(states, params)
+        k2 = model.derivatives(np.maximum(states + dt * k1, 0), params)
+        return np.maximum(states + dt / 2 * (k1 + k2), 0)
+    # production explicit, degradation implicit
+    production = model._produce(model.rates(states, params))
+    return (states + dt * production) / (1 + dt * params['delta'])
+
+@instrumented
+def simulate_population(grn, INS, R0=False, INS_factor=1, t_end=100, t_sample=1, dt=None, scheme='heun', params=None, tol=None, keep='all', safety=0.1, stats=None):
+    """
+        Fixed-step integration of a population of cells (each with its own inputs, initial
+        state and parameters) on a (cells, species) array; all cells advance together.
+
+        INS, R0, params: as in simulate_ensemble
+        scheme: 'euler' and 'heun' (explicit), 'semi-implicit' (explicit production, implicit degradation)
+        dt: step length; None - safety times the largest stable step, re-estimated at every
+            sample point (steps always divide t_sample); the stability limit alone is too
+            coarse for accurate transients, hence the small default safety
+        tol: stop once max |dS/dt| of all cells is below tol at a sample point
+        keep: 'all' - states at every sample point, 'last' - only the final states
+
+        Returns T and Y of shape (cells, len(T), n_species).
+    """
+    if scheme not in POPULATION_SCHEMES:
+        raise ValueError(f'Invalid scheme {scheme!r}!')
+
+    with stats.phase('codegen'):
+        model = grn.array_model()
+    params = model.get_params(params)
+    states = broadcast_ensemble(grn, INS, R0, INS_factor, model.batch_size(params)).copy()
+
+    T = np.arange(0, t_end + t_sample / 2, t_sample)
+    Y = [states.copy()] if keep == 'all' else None
+    n_steps = n_evals = 0
+    message = 'The final time was reached.'
+
+    with stats.phase('integration'):
+        for k in range(1, len(T)):
+            step = dt if dt is not None else stable_step(model, states, params, scheme, safety)
+            n_sub = max(int(np.ceil(t_sample / step - 1e-9)), 1)
+            h = t_sample / n_sub
+
+            for _ in range(n_sub):
+                states = population_step(model, states, params, h, scheme)
+            n_steps += n_sub
+            n_evals += n_sub * (2 if scheme == 'heun' else 1)
+
+            if keep == 'all':
+                Y.append(states.copy())
+
+            if tol is not None and np.max(np.abs(model.derivatives(states, params))) < tol:
+                T = T[:k+1]
+                message = 'All cells converged.'
+                break
+
+    stats.add_record(scheme, n_evals * len(states), 0, 0, n_steps, 0, message)
+
+    if keep == 'all':
+        return T, np.stack(Y, axis=1)
+    return T[-1:], states[:, None]
+
+
+@instrumented
+def simulate_schedule(grn, schedule, model=False, INS_factor=1, R0=False, jac=None, method=None, stats=None):
+    """
+        Integrates a piecewise-constant input program in one pass.
+
+        schedule: list of (IN, duration) pairs; the inputs are switched to IN for the given duration
+        R0: initial state of the non-input species (zeros if False)
+
+        The solver is only restarted at switch points and every segment is written into a
+        preallocated output. Each segment is sampled at integer times 0, 1, ... <= duration
+        relative to its start (boundary points appear twice, as in simulate_sequence).
+    """
+    method = select_method(method)
+    model, jac = load_model(grn, model, jac, method, stats)
+    options = solver_options(grn, method, jac)
+
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    if type(R0)==bool:
+        R0 = np.zeros(n_RS)
+
+    grids = [np.arange(0, np.floor(duration)+1) for IN, duration in schedule]
+    n_rows = sum(len(grid) for grid in grids)
+
+    T = np.empty(n_rows)
+    Y = np.empty((n_rows, n_INS + n_RS))
+
+    state = np.append(np.zeros(n_INS), R0)
+    offset = 0
+    pos = 0
+    for (IN, duration), grid in zip(schedule, grids):
+        state[:n_INS] = np.array(IN)*INS_factor
+
+        sol = integrate(model, [0, duration], state, options, stats, dense_output=True)
+        with stats.phase('interpolation'):
+            Y[pos:pos+len(grid)] = sol.sol(grid).T
+        T[pos:pos+len(grid)] = grid + offset
+
+        pos += len(grid)
+        offset += duration
+        state = sol.y[:, -1].copy()
+
+    return T, Y
+
+
+@instrumented
+def simulate_sequence(grn, IN_seq, model=False, INS_factor=1, t_single=100, plot_on=True, legend=True, xlabel='time [a.u.]', ylabel='concentrations [a.u.]', jac=None, method=None, stats=None):
+    T, Y = simulate_schedule(grn, [(IN, t_single) for IN in IN_seq], model, INS_factor=INS_factor, jac=jac, method=method, stats=stats)
 
     if plot_on:
-        plt.plot(T,Y)
-        if legend:
-            plt.legend(grn.species_names)
+        with stats.phase('plotting'):
+            plt.plot(T,Y)
+            if legend:
+                plt.legend(grn.species_names)
 
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        
-        plt.show()
+            plt.xlabel(xlabel)
+            plt.ylabel(ylabel)
+            
+            plt.show()
 
     return T,Y
\ No newline at end of file
@@ -0,0 +1,188 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve, eigs, ArpackError
+
+
+# networks from this size on are solved with sparse linear algebra
+SPARSE_SPECIES = 500
+
+
+class SteadyStateSystem:
+    """
+        f(x) = 0 restricted to the non-input species of a grn; the input
+        concentrations are fixed parameters of the system, params (see
+        ArrayModel.get_params) override the parameter values of the network.
+    """
+
+    def __init__(self, grn, X0, params=None):
+        self.model = grn.array_model()
+        self.n_INS = len(grn.input_species_names)
+        self.X0 = np.asarray(X0, dtype=float)
+        self.params = params
+        self.sparse = self.model.n_species >= SPARSE_SPECIES
+        # evaluation counts, reported with the solver statistics
+        self.nfev = self.njev = self.nlu = 0
+
+    def full(self, R):
+        return np.concatenate([self.X0, R])
+
+    def residual(self, R):
+        self.nfev += 1
+        return self.model.derivatives(self.full(R), self.params)[self.n_INS:]
+
+    def jacobian(self, R):
+        self.njev += 1
+        J = self.model.jacobian(self.full(R), sparse_output=self.sparse, params=self.params)
+        return J[self.n_INS:, self.n_INS:]
+
+    def solve(self, A, b):
+        self.nlu += 1
+        if self.sparse:
+            return spsolve(sparse.csc_matrix(A), b)
+        return np.linalg.solve(A, b)
+
+    def identity(self, n):
+        return sparse.identity(n, format='csr') if self.sparse else np.eye(n)
+
+
+def is_stable(J):
+    """Linear stability of a fixed point from the Jacobian (None if it cannot be determined)."""
+    if J.shape[0] == 0:
+        return True
+    if sparse.issparse(J):
+        try:
+            eig = eigs(J, k=1, which='LR', return_eigenvectors=False)
+        except (ArpackError, ValueError, TypeError):
+            return None
+    else:
+        eig = np.linalg.eigvals(J)
+    return bool(np.max(eig.real) < 0)
+
+
+def _norm(F):
+    return np.max(np.abs(F)) if len(F) else 0.0
+
+
+def newton(system, R, tol=1e-8, max_iter=50):
+    """Damped Newton iterations with backtracking; concentrations are kept non-negative."""
+    F = system.residual(R)
+    norm = _norm(F)
+
+    for it in range(max_iter):
+        if norm < tol:
+            return R, norm, it, True
+
+        try:
+            dR = system.solve(system.jacobian(R), -F)
+        except np.linalg.LinAlgError:
+            return R, norm, it, False
+        if not np.all(np.isfinite(dR)):
+            return R, norm, it, False
+
+        step = 1.0
+        while step > 1e-4:
+            R_new = np.maximum(R + step * dR, 0)
+            F_new = system.residual(R_new)
+            norm_new = _norm(F_new)
+            if norm_new < (1 - 1e-4 * step) * norm:
+                break
+            step /= 2
+        else:
+            return R, norm, it, False
+
+        R, F, norm = R_new, F_new, norm_new
+
+    return R, norm, max_iter, norm < tol
+
+
+def pseudo_transient(system, R, tol=1e-8, max_iter=2000, dt=0.1, dt_max=1e12, t_max=1e6, growth=1.5, max_change=0.2):
+    """
+        Pseudo-transient continuation: implicit Euler steps (I/dt - J) dR = f(R) that follow
+        the dynamics while the state changes and turn into Newton steps near the fixed point.
+        dt grows geometrically (by at least growth) while the residual falls; steps that change
+        a concentration by more than max_change (relative to 1 + |R|) are retried with dt/2.
+        Stops at pseudo-time t_max or after max_iter steps.
+    """
+    F = system.residual(R)
+    norm = _norm(F)
+    I = system.identity(len(R))
+    t = 0.0
+
+    for it in range(max_iter):
+        if norm < tol:
+            return R, norm, it, True
+        if t >= t_max:
+            return R, norm, it, False
+
+        try:
+            dR = system.solve(I / dt - system.jacobian(R), F)
+        except np.linalg.LinAlgError:
+            dt /= 10
+            continue
+
+        R_new = np.maximum(R + dR, 0)
+        F_new = system.residual(R_new)
+        norm_new = _norm(F_new)
+
+        # large jumps skip over the transient (e.g. onto a saddle), small steps stay on the trajectory
+        if not np.isfinite(norm_new) or np.max(np.abs(R_new - R) / (1 + np.abs(R)), initial=0) > max_change:
+            dt /= 2
+            continue
+
+        t += dt
+        if norm_new < norm:
+            dt = min(max(dt * norm / max(norm_new, 1e-300), dt * growth), dt_max)
+        R, F, norm = R_new, F_new, norm_new
+
+    return R, norm, max_iter, norm < tol
+
+
+def find_steady(grn, IN, INS_factor=1, R0=False, tol=1e-8, max_iter=50, ptc_iter=2000, stable_only=True):
+    """
+        Solves f(x) = 0 directly for the given input vector. Newton iterations with
+        the analytical Jacobian are tried first, pseudo-transient continuation is
+        used when Newton fails (or, with stable_only, when Newton ends in an unstable
+        fixed point, which time integration would leave).
+
+        Returns a dictionary with
+            'state' - full state vector (inputs first),
+            'converged' - whether the residual dropped below tol,
+            'residual' - max norm of the residual,
+            'iterations' - number of iterations of the final method,
+            'method' - 'newton' or 'ptc',
+            'stable' - linear stability of the fixed point (None if undetermined),
+            'nfev', 'njev', 'nlu' - residual and Jacobian evaluations and linear solves of both methods.
+    """
+    n_RS = len(grn.species_names) - len(grn.input_species_names)
+    X0 = np.array(IN, dtype=float) * INS_factor
+
+    if type(R0) == bool:
+        R0 = np.random.random(n_RS)
+    R0 = np.array(R0, dtype=float)
+
+    system = SteadyStateSystem(grn, X0)
+    R, result = solve_system(system, R0, tol, max_iter, ptc_iter, stable_only)
+
+    return dict(state=system.full(R), **result)
+
+
+def solve_system(system, R0, tol=1e-8, max_iter=50, ptc_iter=2000, stable_only=True):
+    # Newton with a pseudo-transient fallback (see find_steady), returns R and the convergence info
+    R, residual, iterations, converged = newton(system, R0, tol, max_iter)
+    method = 'newton'
+    stable = is_stable(system.jacobian(R)) if converged else None
+
+    if not converged or (stable_only and stable is False):
+        # small initial pseudo-time steps follow the dynamics away from unstable points
+        R, residual, iterations, converged = pseudo_transient(system, R0, tol, ptc_iter)
+        method = 'ptc'
+        stable = is_stable(system.jacobian(R)) if converged else None
+
+    return R, {'converged': converged,
+               'residual': residual,
+               'iterations': iterations,
+               'method': method,
+               'stable': stable,
+               'nfev': system.nfev,
+               'njev': system.njev,
+               'nlu': system.nlu}
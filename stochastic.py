@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+
+class Distributions:
+    """
+        Per-time-point statistics of an ensemble of cells, accumulated as the cells pass the
+        time points (trajectories are not stored).
+
+        counts - number of cells recorded at each time point, shape (T,),
+        sums, sums_sq - sums of the copy numbers and their squares, shape (T, n_species),
+        hist - copy-number histograms (copy numbers above max_count are counted in the last
+               bin), shape (T, n_species, max_count + 1); only with max_count.
+    """
+
+    def __init__(self, T, species_names, max_count=None):
+        self.T = T
+        self.species_names = species_names
+        self.max_count = max_count
+
+        N = len(species_names)
+        self.counts = np.zeros(len(T), dtype=int)
+        self.sums = np.zeros((len(T), N))
+        self.sums_sq = np.zeros((len(T), N))
+        self.hist = None if max_count is None else np.zeros((len(T), N, max_count + 1), dtype=int)
+
+    def add(self, k, states):
+        # states of shape (cells, n_species) recorded at time points k (one per cell)
+        k = np.broadcast_to(k, len(states))
+        np.add.at(self.counts, k, 1)
+        np.add.at(self.sums, k, states)
+        np.add.at(self.sums_sq, k, states**2)
+        if self.hist is not None:
+            bins = np.clip(states, 0, self.max_count).astype(int)
+            np.add.at(self.hist, (k[:, None], np.arange(states.shape[1]), bins), 1)
+
+    def mean(self):
+        return self.sums / self.counts[:, None]
+
+    def var(self):
+        return np.maximum(self.sums_sq / self.counts[:, None] - self.mean()**2, 0)
+
+    def std(self):
+        return np.sqrt(self.var())
+
+    def fano(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.var() / self.mean()
+
+    def probabilities(self):
+        """Copy-number distributions, shape (T, n_species, max_count + 1)."""
+        return self.hist / self.counts[:, None, None]
+
+    def frame(self, stat='mean'):
+        """One statistic ('mean', 'var', 'std' or 'fano') as a DataFrame indexed by time."""
+        if stat not in ('mean', 'var', 'std', 'fano'):
+            raise ValueError(f'Invalid statistic {stat!r}!')
+        return pd.DataFrame(getattr(self, stat)(), index=pd.Index(self.T, name='time'), columns=self.species_names)
+
+
+class Reactions:
+    """
+        Reactions implied by a grn: one production reaction per gene (propensity
+        volume * alpha * up/down at concentrations copies/volume, one copy of every
+        product) and one degradation reaction per species with delta > 0.
+    """
+
+    def __init__(self, grn, volume=1):
+        self.model = grn.array_model()
+        self.volume = volume
+        self.degraded = np.flatnonzero(self.model.delta > 0)
+
+        N = self.model.n_species
+        production = self.model.P.T.toarray()
+        degradation = -np.eye(N)[self.degraded]
+        self.stoichiometry = np.vstack([production, degradation])
+
+    def propensities(self, counts):
+        production = self.volume * self.model.rates(counts / self.volume)
+        degradation = self.model.delta[self.degraded] * counts[..., self.degraded]
+        return np.concatenate([production, degradation], axis=-1)
+
+
+def initial_counts(grn, IN, INS_factor, R0, n_cells, volume, rng):
+    # copy numbers of all cells, inputs first; R0 is given in copy numbers (random concentrations in [0, 1) if False)
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    X0 = np.array(IN, dtype=float).reshape(n_INS) * INS_factor * volume
+    if type(R0) == bool:
+        R0 = rng.poisson(rng.random((n_cells, n_RS)) * volume)
+    R0 = np.broadcast_to(np.array(R0, dtype=float).reshape(-1, n_RS), (n_cells, n_RS))
+
+    return np.hstack([np.broadcast_to(X0, (n_cells, n_INS)), R0]).astype(float)
+
+
+def simulate_ssa(grn, IN, INS_factor=1, n_cells=1, t_end=100, dt=1, R0=False, volume=1, max_count=None,
+                 max_steps=10**7, seed=None):
+    """
+        Exact stochastic simulation (Gillespie direct method) of n_cells independent cells.
+        All cells advance together, each by one reaction of its own per step, so the cost of
+        a step is a few array operations over the ensemble.
+
+        volume: copy numbers are volume * concentrations, inputs are fixed at IN * INS_factor * volume
+        R0: initial copy numbers of the non-input species, shape (n_cells, n) or (n,)
+        max_count: copy numbers up to which histograms are collected (None: mean and variance only)
+
+        Returns T and the Distributions of the copy numbers at T.
+    """
+    rng = np.random.default_rng(seed)
+    reactions = Reactions(grn, volume)
+
+    T = np.arange(0, t_end + dt / 2, dt)
+    distributions = Distributions(T, grn.species_names, max_count)
+
+    counts = initial_counts(grn, IN, INS_factor, R0, n_cells, volume, rng)
+    t = np.zeros(n_cells)
+    next_k = np.zeros(n_cells, dtype=int)
+    active = np.arange(n_cells)
+
+    for step in range(max_steps):
+        if not len(active):
+            break
+
+        a = reactions.propensities(counts[active])
+        a_cum = np.cumsum(a, axis=1)
+        a0 = a_cum[:, -1]
+        with np.errstate(divide='ignore'):
+            t_next = t[active] + rng.exponential(1, len(active)) / a0
+
+        # the state is constant until the next reaction, record it at all time points passed
+        passed = next_k[active] < len(T)
+        passed[passed] = T[next_k[active][passed]] <= t_next[passed]
+        while np.any(passed):
+            cells = active[passed]
+            distributions.add(next_k[cells], counts[cells])
+            next_k[cells] += 1
+            passed[passed] = next_k[cells] < len(T)
+            passed[passed] = T[next_k[active][passed]] <= t_next[passed]
+
+        running = next_k[active] < len(T)
+        active, a_cum, a0, t_next = active[running], a_cum[running], a0[running], t_next[running]
+
+        chosen = np.argmax(a_cum > (rng.random(len(active)) * a0)[:, None], axis=1)
+        counts[active] += reactions.stoichiometry[chosen]
+        t[active] = t_next
+
+    return T, distributions
+
+
+def simulate_tau_leaping(grn, IN, INS_factor=1, n_cells=10**4, t_end=100, dt=1, tau=None, R0=False, volume=1,
+                         max_count=None, seed=None):
+    """
+        Approximate stochastic simulation of n_cells cells with tau-leaping: in every leap of
+        length tau each reaction fires a Poisson distributed number of times in all cells at once.
+        Leaps are shortened so that they divide dt; copy numbers are kept non-negative.
+
+        tau: leap length (dt / 10 by default)
+        Other arguments and the returned values are as in simulate_ssa.
+    """
+    rng = np.random.default_rng(seed)
+    reactions = Reactions(grn, volume)
+
+    T = np.arange(0, t_end + dt / 2, dt)
+    distributions = Distributions(T, grn.species_names, max_count)
+
+    counts = initial_counts(grn, IN, INS_factor, R0, n_cells, volume, rng)
+    distributions.add(0, counts)
+
+    if tau is None:
+        tau = dt / 10
+    n_leaps = max(int(np.ceil(dt / tau - 1e-9)), 1)
+    tau = dt / n_leaps
+
+    for k in range(1, len(T)):
+        for _ in range(n_leaps):
+            fired = rng.poisson(reactions.propensities(counts) * tau)
+            counts = np.maximum(counts + fired @ reactions.stoichiometry, 0)
+        distributions.add(k, counts)
+
+    return T, distributions
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import qmc
+
+import params
+import simulator
+from helpers import get_param_values
+
+
+def get_targets(grn, targets=None):
+    """
+        Expands targets into parameter labels (see ArrayModel.param_labels).
+        targets: None (all parameters), or a list of labels and/or kinds ('alpha', 'Kd', 'n', 'delta').
+        Degradation rates of input species are never included through a kind.
+    """
+    labels = grn.array_model().param_labels()
+
+    if targets is None:
+        targets = ['alpha', 'Kd', 'n', 'delta']
+
+    selected = []
+    for target in targets:
+        if target in labels:
+            selected.append(target)
+        elif target in ('alpha', 'Kd', 'n', 'delta'):
+            selected.extend(label for label, (kind, i) in labels.items() if kind == target and
+                            not (kind == 'delta' and grn.species_names[i] in grn.input_species_names))
+        else:
+            raise ValueError(f'Invalid parameter {target!r}!')
+
+    return selected
+
+
+def unit_samples(n_dims, n=None, design='random', levels=5, seed=None):
+    # design points in the unit hypercube, shape (n, n_dims)
+    if design == 'grid':
+        if np.ndim(levels) == 0:
+            levels = [levels] * n_dims
+        axes = [np.linspace(0, 1, k) if k > 1 else np.array([0.5]) for k in levels]
+        return np.array(list(itertools.product(*axes))).reshape(-1, n_dims)
+
+    if design == 'random':
+        return np.random.default_rng(seed).random((n, n_dims))
+    if design == 'lhs':
+        return qmc.LatinHypercube(d=n_dims, seed=seed).random(n)
+    if design == 'sobol':
+        return qmc.Sobol(d=n_dims, seed=seed).random(n)
+
+    raise ValueError(f'Invalid design {design!r}!')
+
+
+def sample(grn, targets=None, n=None, design='random', levels=5, ranges=params.ranges, dist='uniform', seed=None):
+    """
+        Draws parameter sets of a network.
+
+        targets: parameters to vary (see get_targets), the others keep their network values
+        n: number of samples (random, lhs and sobol designs; powers of 2 are preferred for sobol)
+        levels: number of levels per parameter of the grid design (a single value or one per target)
+        ranges: intervals (or values) per kind ('alpha', 'Kd', 'n', 'delta') or per label, as in params.ranges
+        dist: 'uniform' - ranges are intervals, 'normal' - ranges are (mean, sd) of a normal distribution truncated to positive values
+
+        Returns a DataFrame with one column per target.
+    """
+    targets = get_targets(grn, targets)
+    labels = grn.array_model().param_labels()
+
+    U = unit_samples(len(targets), n, design, levels, seed)
+
+    columns = {}
+    for j, label in enumerate(targets):
+        kind = labels[label][0]
+        param_range = ranges[label] if label in ranges else ranges[kind]
+        columns[label] = get_param_values(param_range, U[:, j], dist)
+
+    return pd.DataFrame(columns)
+
+
+def to_params(grn, samples):
+    # parameter arrays with a leading batch dimension for ArrayModel
+    model = grn.array_model()
+    labels = model.param_labels()
+    values = model.get_params()
+
+    P = len(samples)
+    batch = {kind: np.tile(value, (P, 1)) for kind, value in values.items()}
+    for label in samples.columns:
+        kind, i = labels[label]
+        batch[kind][:, i] = samples[label].to_numpy()
+
+    return batch
+
+
+# network of the sweep held by every worker process
+_worker = {}
+
+def _init_worker(grn):
+    _worker['grn'] = grn
+
+
+def simulate_chunk(grn, task):
+    samples, X0, R0, t_end, method = task
+    T, Y = simulator.simulate_ensemble(grn, X0, R0, t_end=t_end, method=method, params=to_params(grn, samples))
+    return Y[:, -1]
+
+
+def _run_chunk(task):
+    return simulate_chunk(_worker['grn'], task)
+
+
+def run_sweep(grn, samples, IN, INS_factor=1, R0=False, t_end=100, method=None, chunk_size=64, n_jobs=1, seed=None, store=None, store_name='sweep'):
+    """
+        Simulates the network for every parameter set in samples (as returned by sample).
+
+        Parameter sets are integrated in chunks of chunk_size as one batched system
+        (simulate_ensemble), chunks are distributed over n_jobs processes (None or -1: all cores).
+        R0: a shared initial state, one per sample, or False (random, drawn with seed).
+
+        store: resultstore.ResultStore every chunk (parameter columns and states) is appended to
+               as it completes (entry store_name), instead of being collected in memory
+
+        Returns a DataFrame with the parameter columns followed by the states at t_end
+        (with store, read back from the shards written by this run).
+    """
+    samples = pd.DataFrame(samples).reset_index(drop=True)
+    n_INS = len(grn.input_species_names)
+    n_RS = len(grn.species_names) - n_INS
+
+    X0 = np.array(IN, dtype=float) * INS_factor
+    if type(R0) == bool:
+        R0 = np.random.default_rng(seed).random((len(samples), n_RS))
+    R0 = np.broadcast_to(np.array(R0, dtype=float).reshape(-1, n_RS), (len(samples), n_RS))
+
+    tasks = [(samples.iloc[i:i+chunk_size], X0, R0[i:i+chunk_size], t_end, method)
+             for i in range(0, len(samples), chunk_size)]
+
+    n_jobs = simulator.get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        chunks = (simulate_chunk(grn, task) for task in tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(grn,))
+        chunks = executor.map(_run_chunk, tasks)
+
+    try:
+        if store is not None:
+            first = len(store.shards(store_name)) if store_name in store.entries() else 0
+            for task, states in zip(tasks, chunks):
+                chunk = pd.concat([task[0].reset_index(drop=True), pd.DataFrame(states, columns=grn.species_names)], axis=1)
+                store.append_table(store_name, chunk, grn=grn, inputs=X0, seed=seed, t_end=t_end)
+            return store.table(store_name, shards=range(first, first + len(tasks)))
+        chunks = list(chunks)
+    finally:
+        if n_jobs != 1:
+            executor.shutdown()
+
+    states = pd.DataFrame(np.vstack(chunks) if chunks else np.zeros((0, len(grn.species_names))),
+                          columns=grn.species_names)
+
+    return pd.concat([samples, states], axis=1)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import params
+import simulator
+from generator import random_network
+
+
+LOGIC_TYPES = {'and': 1, 'or': 1, '': 1}
+
+
+def networks():
+    # random networks with all logic types; integer Hill coefficients (all but the first) are smooth at zero states
+    yield random_network(12, n_inputs=2, in_degree=3, logic_types=LOGIC_TYPES, seed=1)
+    yield random_network(12, n_inputs=2, in_degree=3, logic_types=LOGIC_TYPES, seed=2, ranges=dict(params.ranges, n=2))
+    network = random_network(6, n_inputs=1, in_degree=2, logic_types=LOGIC_TYPES, seed=3, ranges=dict(params.ranges, n=2))
+    # duplicate regulators: the same species twice in one gene, with different parameters
+    network.add_gene(10, [{'name': 'X1', 'type': 1, 'Kd': 5, 'n': 2},
+                          {'name': 'X1', 'type': -1, 'Kd': 20, 'n': 3},
+                          {'name': 'S1', 'type': 1, 'Kd': 10, 'n': 1}],
+                     [{'name': 'S2'}, {'name': 'S3'}], logic_type='and')
+    yield network
+
+
+NETWORKS = list(networks())
+
+
+def states(network, seed=0):
+    rng = np.random.default_rng(seed)
+    S = rng.random((4, len(network.species_names))) * 30
+    S[0] = 0                  # all zero
+    S[1, ::2] = 0             # some species zero
+    return S
+
+
+def compile_source(source):
+    namespace = {}
+    exec(compile(source, '<test model>', 'exec'), namespace)
+    return namespace['solve_model']
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_codegen_matches_array_model(network):
+    codegen = network.compile_model('codegen')
+    model = network.array_model()
+    for state in states(network):
+        assert np.allclose(codegen(0, state), model.derivatives(state), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('network', NETWORKS)
+def test_factorized_matches_expanded(network):
+    factorized = compile_source(network.generate_model_source())
+    expanded = compile_source(network.generate_model_source(expand=True))
+    for state in states(network):
+        assert np.allclose(factorized(0, state), expanded(0, state), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('network', NETWORKS[1:])
+def test_jacobian_matches_finite_differences(network):
+    model = network.array_model()
+    h = 1e-6
+    for state in states(network):
+        J = model.jacobian(state)
+        J_fd = np.column_stack([(model.derivatives(state + h * e) - model.derivatives(state - h * e)) / (2 * h)
+                                for e in np.eye(len(state))])
+        assert np.allclose(J, J_fd, rtol=1e-5, atol=1e-6)
+        assert np.allclose(model.jacobian(state, sparse_output=True).toarray(), J)
+
+
+def test_ensemble_matches_single():
+    network = random_network(8, n_inputs=2, in_degree=2, activator_ratio=1, logic_types=LOGIC_TYPES,
+                             seed=4, ranges=dict(params.ranges, n=2))
+    INS = np.array([[0, 0], [1, 0], [0, 1], [1, 1]]) * 10
+    R0 = np.random.default_rng(0).random((len(INS), 8)) * 10
+
+    T, Y = simulator.simulate_ensemble(network, INS, R0, t_end=50)
+    for b in range(len(INS)):
+        T_single, Y_single = simulator.simulate_single(network, INS[b], R0=R0[b], t_end=50, plot_on=False)
+        assert np.allclose(Y[b], Y_single, rtol=1e-2, atol=1e-2)
+
+
+def test_ensemble_without_inputs():
+    # repressor circuit without input species (as a toggle switch)
+    network = random_network(2, n_inputs=0, in_degree=1, activator_ratio=0, seed=5, ranges=dict(params.ranges, n=2))
+    R0 = np.random.default_rng(1).random((3, 2)) * 10
+
+    T, Y = simulator.simulate_ensemble(network, [], R0, t_end=20)
+    T_pop, Y_pop = simulator.simulate_population(network, [], R0, t_end=20)
+    assert Y.shape == Y_pop.shape == (3, 21, 2)
+    assert np.allclose(Y_pop[:, -1], Y[:, -1], rtol=1e-2, atol=1e-2)